@@ -6,13 +6,96 @@ import jieba
 import jieba.analyse
 from collections import Counter
 import logging
+import json
+import re
+import argparse
 from datetime import datetime
 import matplotlib as mpl
 from matplotlib.font_manager import FontProperties
+from typing import Optional
+from profiling import RunProfiler
+
+# 统计用到的列和类型，明确指定后读取更快、内存更小；导出的CSV仍保留结果文件的全部列
+ANALYSIS_COLUMNS = ['title', 'url', 'snippet', 'site', 'time_range', 'found_date']
+ANALYSIS_DTYPES = {
+    'title': 'object',
+    'url': 'object',
+    'snippet': 'object',
+    'site': 'category',
+    'time_range': 'category',
+    'found_date': 'object'
+}
+FOUND_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+# 超过这个大小的结果文件自动按块流式分析
+STREAMING_THRESHOLD_BYTES = 256 * 1024 * 1024
+DEFAULT_CHUNKSIZE = 100_000
+
+class KeywordCounter:
+    """可增量累加的 TF-IDF 关键词统计，结果与 jieba.analyse.extract_tags 一致"""
+    def __init__(self):
+        self.tfidf = jieba.analyse.default_tfidf
+        self.freq = Counter()
+
+    def update(self, text: str) -> None:
+        stop_words = self.tfidf.stop_words
+        for word in self.tfidf.tokenizer.cut(text):
+            if len(word.strip()) < 2 or word.lower() in stop_words:
+                continue
+            self.freq[word] += 1
+
+    def top(self, k: int = 20):
+        total = sum(self.freq.values())
+        if not total:
+            return []
+        idf_freq, median_idf = self.tfidf.idf_freq, self.tfidf.median_idf
+        weights = {word: count * idf_freq.get(word, median_idf) / total for word, count in self.freq.items()}
+        return sorted(weights.items(), key=lambda item: item[1], reverse=True)[:k]
+
+class AnalysisStats:
+    """报告所需的全部统计量，可以对整个文件一次性计算，也可以逐块累加"""
+    def __init__(self, now: pd.Timestamp):
+        self.cutoff_24h = now - pd.Timedelta(days=1)
+        self.cutoff_7d = now - pd.Timedelta(days=7)
+        self.site_counts = Counter()
+        self.hour_counts = Counter()
+        self.count_24h = 0
+        self.count_7d = 0
+        self.sites_24h = set()
+        self.game_counts = Counter()
+        self.keywords_all = KeywordCounter()
+        self.keywords_24h = KeywordCounter()
+
+    def update(self, df: pd.DataFrame) -> None:
+        """累加一块数据"""
+        # 时间列只解析一次，图表和报告共用
+        found_date = pd.to_datetime(df['found_date'], format=FOUND_DATE_FORMAT, errors='coerce')
+        text = df['title'].fillna('') + ' ' + df['snippet'].fillna('')
+
+        site_counts = df['site'].value_counts()
+        self.site_counts.update(site_counts[site_counts > 0].to_dict())
+        self.hour_counts.update(found_date.dt.hour.dropna().astype(int).value_counts().to_dict())
+        self.keywords_all.update(' '.join(text))
+
+        in_24h = found_date > self.cutoff_24h
+        self.count_24h += int(in_24h.sum())
+        self.count_7d += int((found_date > self.cutoff_7d).sum())
+
+        news_24h = df[in_24h]
+        self.sites_24h.update(news_24h['site'].dropna().unique())
+        # 提取游戏名称（从标题中提取括号内的内容），只统计24小时内的游戏
+        for title in news_24h['title']:
+            self.game_counts.update(re.findall(r'[《\(（](.*?)[》\)）]', str(title)))
+        # 提取关键词（只从24小时内的新闻提取）
+        self.keywords_24h.update(' '.join(text[in_24h]))
 
 class ResultAnalyzer:
-    def __init__(self, input_file: str):
+    def __init__(self, input_file: str, profiler: Optional[RunProfiler] = None,
+                 chunksize: Optional[int] = None):
         self.input_file = input_file
+        self.profiler = profiler or RunProfiler()
+        self.chunksize = chunksize
+        if self.chunksize is None and Path(input_file).stat().st_size > STREAMING_THRESHOLD_BYTES:
+            self.chunksize = DEFAULT_CHUNKSIZE
         self.output_dir = Path('analysis_results')
         self.output_dir.mkdir(exist_ok=True)
         
@@ -26,15 +109,25 @@ class ResultAnalyzer:
     def analyze(self):
         """分析结果并生成报告"""
         try:
-            df = pd.read_csv(self.input_file)
+            stats = AnalysisStats(pd.Timestamp.now())
+            export_file = self.output_dir / 'game_news.csv'
+
+            with self.profiler.stage('analysis.load'):
+                for chunk in self._read_chunks():
+                    stats.update(chunk)
+
+            with self.profiler.stage('analysis.export'):
+                self._export_recent(stats.cutoff_24h, export_file)
             
             # 生成图表
-            self._plot_site_distribution(df)
-            self._plot_time_distribution(df)
-            self._plot_keyword_distribution(df)
+            with self.profiler.stage('analysis.charts'):
+                self._plot_site_distribution(stats.site_counts)
+                self._plot_time_distribution(stats.hour_counts)
+                self._plot_keyword_distribution(stats.keywords_all.top(20))
             
             # 生成文本报告
-            self._generate_report(df)
+            with self.profiler.stage('analysis.report'):
+                self._generate_report(stats)
             
             logging.info("分析完成！报告已保存到 analysis_results/analysis_report.md")
             
@@ -42,10 +135,37 @@ class ResultAnalyzer:
             logging.error(f"分析过程出错: {str(e)}")
             raise
 
-    def _plot_site_distribution(self, df):
+    def _read_chunks(self, all_columns: bool = False):
+        """按列和类型读取结果文件，指定 chunksize 时分块读取以限制内存
+
+        all_columns 为 True 时读取全部列并保持原始文本，用于导出
+        """
+        if all_columns:
+            read_args = {'dtype': str}
+        else:
+            read_args = {
+                'usecols': lambda column: column in ANALYSIS_COLUMNS,
+                'dtype': ANALYSIS_DTYPES
+            }
+        if self.chunksize:
+            logging.info(f"按每块 {self.chunksize} 行流式分析")
+            yield from pd.read_csv(self.input_file, chunksize=self.chunksize, **read_args)
+        else:
+            yield pd.read_csv(self.input_file, **read_args)
+
+    def _export_recent(self, cutoff: pd.Timestamp, export_file: Path) -> None:
+        """把24小时内的数据连同结果文件的全部列逐块写入CSV（附加 hour 列），内存中不保留"""
+        for i, chunk in enumerate(self._read_chunks(all_columns=True)):
+            found_date = pd.to_datetime(chunk['found_date'], format=FOUND_DATE_FORMAT, errors='coerce')
+            news_24h = chunk[found_date > cutoff].copy()
+            news_24h['hour'] = found_date[found_date > cutoff].dt.hour
+            news_24h.to_csv(export_file, mode='w' if i == 0 else 'a', header=i == 0,
+                            index=False, encoding='utf-8')
+
+    def _plot_site_distribution(self, site_counts: Counter):
         """绘制网站分布图"""
         plt.figure(figsize=(10, 6))
-        site_counts = df['site'].value_counts()
+        site_counts = pd.Series(site_counts, dtype='int64').sort_values(ascending=False)
         sns.barplot(x=site_counts.values, y=site_counts.index)
         plt.title('各网站新闻数量分布')
         plt.xlabel('新闻数量')
@@ -54,12 +174,10 @@ class ResultAnalyzer:
         plt.savefig(self.output_dir / 'site_distribution.png', dpi=300, bbox_inches='tight')
         plt.close()
 
-    def _plot_time_distribution(self, df):
+    def _plot_time_distribution(self, hour_counts: Counter):
         """绘制时间分布图"""
         plt.figure(figsize=(10, 6))
-        df['found_date'] = pd.to_datetime(df['found_date'])
-        df['hour'] = df['found_date'].dt.hour
-        hour_counts = df['hour'].value_counts().sort_index()
+        hour_counts = pd.Series(hour_counts, dtype='int64').sort_index()
         sns.barplot(x=hour_counts.index, y=hour_counts.values)
         plt.title('新闻发布时间分布')
         plt.xlabel('小时')
@@ -68,16 +186,10 @@ class ResultAnalyzer:
         plt.savefig(self.output_dir / 'time_distribution.png', dpi=300, bbox_inches='tight')
         plt.close()
 
-    def _plot_keyword_distribution(self, df):
+    def _plot_keyword_distribution(self, keywords):
         """绘制关键词分布图"""
         plt.figure(figsize=(12, 6))
         
-        # 合并标题和摘要进行分析
-        text = ' '.join(df['title'].fillna('') + ' ' + df['snippet'].fillna(''))
-        
-        # 使用 jieba 进行分词和关键词提取
-        keywords = jieba.analyse.extract_tags(text, topK=20, withWeight=True)
-        
         # 绘制关键词词云图
         words, weights = zip(*keywords)
         plt.barh(range(len(words)), weights)
@@ -88,46 +200,19 @@ class ResultAnalyzer:
         plt.savefig(self.output_dir / 'keyword_distribution.png', dpi=300, bbox_inches='tight')
         plt.close()
 
-    def _generate_report(self, df):
+    def _generate_report(self, stats: AnalysisStats):
         """生成分析报告"""
-        # 转换时间列
-        df['found_date'] = pd.to_datetime(df['found_date'])
-        
-        # 计算24小时内和一周内的新闻数量
-        now = pd.Timestamp.now()
-        news_24h = df[df['found_date'] > (now - pd.Timedelta(days=1))]
-        news_7d = df[df['found_date'] > (now - pd.Timedelta(days=7))]
-        
-        # 基本统计
-        total_news = len(df)
-        site_stats = df['site'].value_counts()
-        
-        # 提取游戏名称（从标题中提取括号内的内容）
-        def extract_game_names(text):
-            import re
-            games = re.findall(r'[《\(（](.*?)[》\)）]', str(text))
-            return games
-            
-        all_games = []
-        for title in news_24h['title']:  # 只统计24小时内的游戏
-            games = extract_game_names(title)
-            all_games.extend(games)
-        
-        game_counts = Counter(all_games)
-        top_games = game_counts.most_common(10)
-        
-        # 提取关键词（只从24小时内的新闻提取）
-        text = ' '.join(news_24h['title'].fillna('') + ' ' + news_24h['snippet'].fillna(''))
-        keywords = jieba.analyse.extract_tags(text, topK=20, withWeight=True)
+        top_games = stats.game_counts.most_common(10)
+        keywords = stats.keywords_24h.top(20)
         
         # 生成 Markdown 报告
         report = f"""# 游戏新闻数据分析报告
 
 ## 基本统计
-- 总条目数: {len(news_24h)}
-- 网站数量: {len(news_24h['site'].unique())}
-- 24小时内新闻: {len(news_24h)}
-- 一周内新闻: {len(news_7d)}
+- 总条目数: {stats.count_24h}
+- 网站数量: {len(stats.sites_24h)}
+- 24小时内新闻: {stats.count_24h}
+- 一周内新闻: {stats.count_7d}
 
 ## 热门游戏 (Top 10)
 | 游戏名称 | 提及次数 |
@@ -138,16 +223,36 @@ class ResultAnalyzer:
 | 关键词 | 出现次数 |
 |--------|----------|
 {chr(10).join([f'| {word} | {int(count * 100)} |' for word, count in keywords])}
-"""
+{self._run_status_note()}"""
         
         # 保存报告
         with open(self.output_dir / 'analysis_report.md', 'w', encoding='utf-8') as f:
             f.write(report)
-            
-        # 保存24小时内的数据到CSV
-        news_24h.to_csv(self.output_dir / 'game_news.csv', index=False, encoding='utf-8')
 
-def main():
+    def _run_status_note(self) -> str:
+        """爬取因时间预算提前结束时，在报告中列出未覆盖的站点"""
+        status_file = Path('run_status.json')
+        if not status_file.exists():
+            return ''
+        try:
+            with open(status_file, 'r', encoding='utf-8') as f:
+                status = json.load(f)
+        except Exception as e:
+            logging.warning(f"读取运行状态失败: {str(e)}")
+            return ''
+        # 运行状态只描述写出它的那次运行，分析的是其他结果文件时忽略
+        results_file = status.get('results_file')
+        if not results_file or Path(results_file).resolve() != Path(self.input_file).resolve():
+            return ''
+        if not status.get('budget_exhausted'):
+            return ''
+        skipped = status.get('skipped_sites', [])
+        return f"""
+## 注意
+本次爬取因时间预算用尽提前结束，以下 {len(skipped)} 个站点未覆盖: {', '.join(skipped)}
+"""
+
+def main(profiler: Optional[RunProfiler] = None, chunksize: Optional[int] = None):
     # 获取最新的结果文件
     result_files = list(Path('.').glob('game_news_*.csv'))
     if not result_files:
@@ -158,7 +263,7 @@ def main():
     logging.info(f"分析文件: {latest_file}")
     
     # 创建分析器并生成报告
-    analyzer = ResultAnalyzer(latest_file)
+    analyzer = ResultAnalyzer(latest_file, profiler, chunksize)
     analyzer.analyze()
 
 if __name__ == "__main__":
@@ -166,4 +271,7 @@ if __name__ == "__main__":
         level=logging.INFO,
         format='%(asctime)s - %(levelname)s - %(message)s'
     )
-    main()
+    parser = argparse.ArgumentParser(description='分析最新的爬取结果')
+    parser.add_argument('--chunksize', type=int,
+                        help='按块流式读取，每块行数；不指定时文件超过 256MB 自动启用')
+    main(chunksize=parser.parse_args().chunksize)
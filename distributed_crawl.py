@@ -0,0 +1,316 @@
+import argparse
+import asyncio
+import bisect
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import pandas as pd
+
+from game_monitor import GameMonitor
+
+TIME_WINDOWS = ('24h', '1w')
+
+
+class Task(NamedTuple):
+    id: int
+    run_id: str
+    site: str
+    window: str
+    node: str
+    lease_token: str
+    attempts: int
+
+
+class HashRing:
+    """一致性哈希环，保证同一个域名总是落在同一个节点上"""
+    def __init__(self, nodes: Iterable[str], replicas: int = 100):
+        self.replicas = replicas
+        self._ring: List[Tuple[int, str]] = []
+        for node in nodes:
+            for i in range(replicas):
+                self._ring.append((self._hash(f'{node}#{i}'), node))
+        self._ring.sort()
+        self._keys = [key for key, _ in self._ring]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int(hashlib.md5(value.encode('utf-8')).hexdigest()[:16], 16)
+
+    def node_for(self, site: str) -> str:
+        if not self._ring:
+            raise ValueError("哈希环中没有节点")
+        index = bisect.bisect(self._keys, self._hash(site)) % len(self._ring)
+        return self._ring[index][1]
+
+
+class WorkQueue:
+    """工作队列接口：按节点租用 (站点, 时间窗口) 任务，超时未确认的任务会重新可见"""
+    def enqueue(self, run_id: str, sites: List[str], ring: HashRing) -> int:
+        raise NotImplementedError
+
+    def reassign(self, run_id: str, ring: HashRing) -> int:
+        raise NotImplementedError
+
+    def lease(self, run_id: str, node: str, visibility_timeout: float) -> Optional[Task]:
+        raise NotImplementedError
+
+    def ack(self, task: Task) -> bool:
+        raise NotImplementedError
+
+    def release(self, task: Task) -> None:
+        raise NotImplementedError
+
+    def latest_run(self) -> Optional[str]:
+        raise NotImplementedError
+
+    def stats(self, run_id: str) -> Dict[str, int]:
+        raise NotImplementedError
+
+
+class SQLiteWorkQueue(WorkQueue):
+    """基于 SQLite 文件锁的工作队列，可放在多个节点共享的卷上"""
+    def __init__(self, path: str, max_attempts: int = 3):
+        self.path = path
+        self.max_attempts = max_attempts
+        # 共享卷（NFS等）上不能使用 WAL，保持默认的回滚日志模式，依赖文件锁互斥
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                run_id TEXT NOT NULL,
+                site TEXT NOT NULL,
+                window TEXT NOT NULL,
+                node TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                lease_until REAL NOT NULL DEFAULT 0,
+                lease_token TEXT NOT NULL DEFAULT '',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                UNIQUE (run_id, site, window)
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_tasks_node ON tasks (run_id, node, status)')
+
+    def enqueue(self, run_id: str, sites: List[str], ring: HashRing) -> int:
+        rows = [(run_id, site, window, ring.node_for(site)) for site in sites for window in TIME_WINDOWS]
+        with self._transaction():
+            before = self.conn.total_changes
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO tasks (run_id, site, window, node) VALUES (?, ?, ?, ?)', rows)
+            return self.conn.total_changes - before
+
+    def reassign(self, run_id: str, ring: HashRing) -> int:
+        """节点变化后重新分配未完成的任务，一致性哈希只会移动少量域名
+
+        移走的任务同时清掉租约令牌，原节点之后的 ack 不会再生效
+        """
+        moved = 0
+        with self._transaction():
+            rows = self.conn.execute(
+                "SELECT id, site, node FROM tasks WHERE run_id = ? AND status != 'done'", (run_id,)).fetchall()
+            for task_id, site, node in rows:
+                new_node = ring.node_for(site)
+                if new_node != node:
+                    self.conn.execute(
+                        "UPDATE tasks SET node = ?, status = 'pending', lease_until = 0, lease_token = '' WHERE id = ?",
+                        (new_node, task_id))
+                    moved += 1
+        return moved
+
+    def lease(self, run_id: str, node: str, visibility_timeout: float) -> Optional[Task]:
+        now = time.time()
+        token = uuid.uuid4().hex
+        with self._transaction():
+            row = self.conn.execute('''
+                SELECT id, site, window, attempts FROM tasks
+                WHERE run_id = ? AND node = ? AND attempts < ?
+                  AND (status = 'pending' OR (status = 'leased' AND lease_until < ?))
+                ORDER BY id LIMIT 1
+            ''', (run_id, node, self.max_attempts, now)).fetchone()
+            if row is None:
+                return None
+            task_id, site, window, attempts = row
+            self.conn.execute(
+                "UPDATE tasks SET status = 'leased', lease_until = ?, lease_token = ?, attempts = ? WHERE id = ?",
+                (now + visibility_timeout, token, attempts + 1, task_id))
+        return Task(task_id, run_id, site, window, node, token, attempts + 1)
+
+    def ack(self, task: Task) -> bool:
+        """确认完成；租约已过期并被其他租用者拿走时返回 False"""
+        with self._transaction():
+            cursor = self.conn.execute(
+                "UPDATE tasks SET status = 'done' WHERE id = ? AND lease_token = ?", (task.id, task.lease_token))
+        return cursor.rowcount == 1
+
+    def release(self, task: Task) -> None:
+        with self._transaction():
+            self.conn.execute(
+                "UPDATE tasks SET status = 'pending', lease_until = 0 WHERE id = ? AND lease_token = ?",
+                (task.id, task.lease_token))
+
+    def latest_run(self) -> Optional[str]:
+        row = self.conn.execute('SELECT run_id FROM tasks ORDER BY id DESC LIMIT 1').fetchone()
+        return row[0] if row else None
+
+    def stats(self, run_id: str) -> Dict[str, int]:
+        rows = self.conn.execute(
+            'SELECT status, COUNT(*) FROM tasks WHERE run_id = ? GROUP BY status', (run_id,)).fetchall()
+        return dict(rows)
+
+    def _transaction(self):
+        return _ImmediateTransaction(self.conn)
+
+
+class _ImmediateTransaction:
+    """BEGIN IMMEDIATE 事务，在读取前就拿到写锁，避免两个节点租到同一个任务"""
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+        return False
+
+
+async def run_node(work_queue: WorkQueue, run_id: str, node: str, shard_dir: str,
+                   visibility_timeout: float = 600) -> None:
+    """在当前节点上持续租用并处理分配给自己的任务，结果写入本节点的分片"""
+    shard_path = Path(shard_dir) / run_id
+    shard_path.mkdir(parents=True, exist_ok=True)
+
+    # 用全局历史过滤旧内容，新记录写入本节点的历史分片
+    monitor = GameMonitor(sites=[])
+    monitor.history_file = str(shard_path / f'url_history_{node}.json')
+    monitor.results_file = str(shard_path / f'game_news_{node}.csv')
+
+    try:
+        await monitor._init_browser()
+        while not monitor.is_interrupted:
+            task = work_queue.lease(run_id, node, visibility_timeout)
+            if task is None:
+                break
+
+            logging.info(f"[{node}] Monitoring site: {task.site} ({task.window})")
+            try:
+                # 所有引擎都失败时抛出异常，任务释放后重试，而不是当作已完成
+                results = await monitor.search_new_pages(task.site, task.window, require_success=True)
+                if results:
+                    monitor._save_results(results)
+                monitor._save_url_history()
+                if not work_queue.ack(task):
+                    logging.warning(f"[{node}] 任务 {task.site} ({task.window}) 租约已过期")
+            except Exception as e:
+                logging.error(f"[{node}] Failed to process site {task.site}: {str(e)}")
+                work_queue.release(task)
+
+            await monitor._pause(10, 20)
+    finally:
+        if monitor.browser:
+            await monitor.browser.close()
+        monitor._save_url_history()
+
+    logging.info(f"[{node}] 没有剩余任务: {work_queue.stats(run_id)}")
+
+
+def merge_shards(shard_dir: str, run_id: str, history_file: str = 'url_history.json') -> Optional[str]:
+    """合并所有节点的结果分片和URL历史，生成单个结果文件"""
+    shard_path = Path(shard_dir) / run_id
+    result_files = sorted(shard_path.glob('game_news_*.csv'))
+    output_file = None
+
+    if result_files:
+        df = pd.concat([pd.read_csv(f, encoding='utf-8-sig') for f in result_files], ignore_index=True)
+        df = df.drop_duplicates(subset='url', keep='first')
+        output_file = f'game_news_{run_id}.csv'
+        df.to_csv(output_file, index=False, encoding='utf-8-sig')
+        logging.info(f"合并 {len(result_files)} 个分片，共 {len(df)} 条结果 -> {output_file}")
+    else:
+        logging.warning(f"{shard_path} 中没有结果分片")
+
+    history = {}
+    history_files = [Path(history_file)] + sorted(shard_path.glob('url_history_*.json'))
+    for path in history_files:
+        if not path.exists():
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            for url, timestamp in json.load(f).items():
+                if url not in history or timestamp > history[url]:
+                    history[url] = timestamp
+    with open(history_file, 'w', encoding='utf-8') as f:
+        json.dump(history, f, ensure_ascii=False, indent=4)
+    logging.info(f"合并URL历史 {len(history)} 条 -> {history_file}")
+
+    return output_file
+
+
+def load_sites(path: str = 'sites.txt') -> List[str]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='多节点分片爬取')
+    parser.add_argument('--queue', required=True, help='共享卷上的任务队列数据库路径')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    enqueue = subparsers.add_parser('enqueue', help='为本次运行创建任务并按节点分配')
+    enqueue.add_argument('--nodes', required=True, help='逗号分隔的节点名称')
+    enqueue.add_argument('--sites', default='sites.txt')
+    enqueue.add_argument('--run-id', default=datetime.now().strftime('%Y%m%d_%H%M%S'))
+
+    reassign = subparsers.add_parser('reassign', help='节点变化后重新分配未完成的任务')
+    reassign.add_argument('--nodes', required=True)
+    reassign.add_argument('--run-id')
+
+    work = subparsers.add_parser('work', help='在当前节点处理分配给它的任务')
+    work.add_argument('--node', required=True)
+    work.add_argument('--shard-dir', required=True, help='共享卷上的结果分片目录')
+    work.add_argument('--run-id')
+    work.add_argument('--visibility-timeout', type=float, default=600)
+
+    merge = subparsers.add_parser('merge', help='合并各节点的结果分片和URL历史')
+    merge.add_argument('--shard-dir', required=True)
+    merge.add_argument('--run-id')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    work_queue = SQLiteWorkQueue(args.queue)
+
+    if args.command == 'enqueue':
+        ring = HashRing(args.nodes.split(','))
+        count = work_queue.enqueue(args.run_id, load_sites(args.sites), ring)
+        logging.info(f"运行 {args.run_id} 新建 {count} 个任务")
+        return
+
+    run_id = args.run_id or work_queue.latest_run()
+    if run_id is None:
+        logging.error("队列中没有任务，请先执行 enqueue")
+        return
+
+    if args.command == 'reassign':
+        moved = work_queue.reassign(run_id, HashRing(args.nodes.split(',')))
+        logging.info(f"运行 {run_id} 重新分配了 {moved} 个任务")
+    elif args.command == 'work':
+        asyncio.run(run_node(work_queue, run_id, args.node, args.shard_dir, args.visibility_timeout))
+    elif args.command == 'merge':
+        stats = work_queue.stats(run_id)
+        unfinished = sum(count for status, count in stats.items() if status != 'done')
+        if unfinished:
+            logging.warning(f"运行 {run_id} 还有 {unfinished} 个任务未完成: {stats}")
+        merge_shards(args.shard_dir, run_id)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import logging
+import time
+from typing import Callable, Optional, Sequence
+
+# 各搜索引擎拦截页面中的特征文本（小写匹配）。只用于对应引擎的结果页，
+# 普通新闻页面的评论、登录组件里常见 recaptcha 之类的字样，不能据此判断
+GOOGLE_BLOCK_MARKERS = (
+    'unusual traffic from your computer network',
+    'our systems have detected unusual traffic',
+    'id="captcha-form"',
+    'before you continue to google',
+)
+
+BING_BLOCK_MARKERS = (
+    'class="b_captcha"',
+)
+
+# 被重定向到这些地址说明遇到了验证或同意页面
+BLOCK_URL_MARKERS = (
+    'google.com/sorry/',
+    'consent.google.com',
+    'bing.com/turing/captcha',
+)
+
+BLOCK_STATUS_CODES = (403, 429, 503)
+
+
+class BlockedError(Exception):
+    """请求被搜索引擎或网站拦截（验证码、同意页、429等）"""
+
+
+class PageLayoutError(Exception):
+    """结果页中找不到预期的列表（网站改版或列表为空），按普通失败处理，不算拦截"""
+
+
+def detect_block(url: Optional[str], status: Optional[int], html: Optional[str],
+                 markers: Sequence[str] = ()) -> Optional[str]:
+    """判断响应是否是拦截页面，是则返回原因；页面内容只按调用方给出的 markers 匹配"""
+    if status in BLOCK_STATUS_CODES:
+        return f'HTTP {status}'
+    if url:
+        lowered_url = url.lower()
+        for marker in BLOCK_URL_MARKERS:
+            if marker in lowered_url:
+                return f'重定向到 {marker}'
+    if html and markers:
+        lowered = html.lower()
+        for marker in markers:
+            if marker in lowered:
+                return f'页面包含 "{marker}"'
+    return None
+
+
+class CircuitBreaker:
+    """搜索引擎熔断器
+
+    连续失败达到阈值或检测到拦截时断开，冷却期内直接跳过；冷却结束后进入半开状态，
+    只放行一个探测请求，成功则恢复，失败则以加倍的冷却时间再次断开。
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, failure_threshold: int = 3, cooldown: float = 600,
+                 max_cooldown: float = 3600, clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.opened_at = 0.0
+        self.cooldown = cooldown
+        self._probe_in_flight = False
+
+    def available(self) -> bool:
+        """不改变状态的检查，用于决定是否值得排队等待该引擎"""
+        if self.state == self.OPEN:
+            return self.clock() - self.opened_at >= self.cooldown
+        if self.state == self.HALF_OPEN:
+            return not self._probe_in_flight
+        return True
+
+    def allow(self) -> bool:
+        """请求前调用，返回是否放行"""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if self.clock() - self.opened_at < self.cooldown:
+                return False
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+            logging.info(f"{self.name} 冷却结束，进入半开状态试探")
+        if self._probe_in_flight:
+            return False
+        self._probe_in_flight = True
+        return True
+
+    def record_success(self) -> None:
+        if self.state != self.CLOSED:
+            logging.info(f"{self.name} 探测成功，恢复正常")
+        self.state = self.CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.cooldown = self.base_cooldown
+        self._probe_in_flight = False
+
+    def record_failure(self, reason: str = '') -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self._trip(reason)
+
+    def record_block(self, reason: str) -> None:
+        """检测到拦截时立即断开，继续请求只会浪费时间"""
+        self.failures = max(self.failures + 1, self.failure_threshold)
+        self._trip(reason)
+
+    def _trip(self, reason: str) -> None:
+        self.cooldown = min(self.base_cooldown * (2 ** self.trips), self.max_cooldown)
+        self.trips += 1
+        self.state = self.OPEN
+        self.opened_at = self.clock()
+        self._probe_in_flight = False
+        logging.warning(f"{self.name} 已熔断 {self.cooldown:.0f} 秒: {reason}")
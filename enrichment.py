@@ -0,0 +1,226 @@
+import asyncio
+import json
+import logging
+import re
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import urljoin, urlsplit
+
+import requests
+from bs4 import BeautifulSoup
+
+from records import NewsItem
+
+# 每个页面最多读取的字节数，canonical、meta 和 JSON-LD 一般都在 <head> 里
+DEFAULT_MAX_BYTES = 64 * 1024
+# 导语最长保留的字符数
+LEAD_MAX_CHARS = 200
+# 正文段落的最短长度，过滤掉导航、版权之类的短文本
+LEAD_MIN_CHARS = 30
+# 缓存只保留最近7天，与 url_history.json 一致
+CACHE_DAYS = 7
+# 超时、连接错误、5xx、429 等暂时性失败过这么久（秒）后重试
+RETRY_DELAY = 6 * 3600
+TRANSIENT_STATUS_CODES = (408, 425, 429)
+
+# 按优先级排列的发布时间 meta 标签
+PUBLISH_META = (
+    ('property', 'article:published_time'),
+    ('property', 'og:published_time'),
+    ('itemprop', 'datePublished'),
+    ('name', 'pubdate'),
+    ('name', 'publishdate'),
+    ('name', 'publish_date'),
+    ('name', 'PubDate'),
+)
+
+_DATE_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d', '%Y年%m月%d日 %H:%M', '%Y年%m月%d日')
+_SPACES = re.compile(r'\s+')
+
+
+def parse_publish_time(value: str) -> int:
+    """解析常见的发布时间写法，返回时间戳，无法识别时返回 0"""
+    value = (value or '').strip()
+    if not value:
+        return 0
+    try:
+        return int(datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp())
+    except ValueError:
+        pass
+    value = value.replace('/', '-').replace('T', ' ')
+    for fmt in _DATE_FORMATS:
+        try:
+            return int(datetime.strptime(value, fmt).timestamp())
+        except ValueError:
+            continue
+    return 0
+
+
+def _json_ld_published(soup: BeautifulSoup) -> str:
+    """从 JSON-LD 中找 datePublished，兼容数组和 @graph 两种写法"""
+    for script in soup.find_all('script', type='application/ld+json'):
+        try:
+            data = json.loads(script.string or '')
+        except ValueError:
+            continue
+        nodes = data if isinstance(data, list) else [data]
+        for node in nodes:
+            if not isinstance(node, dict):
+                continue
+            for candidate in [node] + [n for n in node.get('@graph', []) if isinstance(n, dict)]:
+                if candidate.get('datePublished'):
+                    return str(candidate['datePublished'])
+    return ''
+
+
+def extract_article(html, url: str) -> Dict[str, object]:
+    """从（可能被截断的）页面中提取 canonical URL、发布时间和导语"""
+    soup = BeautifulSoup(html, 'html.parser')
+    info = {'canonical_url': '', 'publish_ts': 0, 'lead': ''}
+
+    link = soup.find('link', rel='canonical') or soup.find('meta', property='og:url')
+    href = (link.get('href') or link.get('content')) if link else None
+    if href:
+        info['canonical_url'] = urljoin(url, href.strip())
+
+    for attr, name in PUBLISH_META:
+        tag = soup.find('meta', attrs={attr: name})
+        if tag and tag.get('content'):
+            info['publish_ts'] = parse_publish_time(tag['content'])
+            if info['publish_ts']:
+                break
+    if not info['publish_ts']:
+        info['publish_ts'] = parse_publish_time(_json_ld_published(soup))
+
+    # 优先在正文容器里找第一个够长的段落，找不到再用 description
+    container = soup.find('article') or soup.find('main') or soup
+    for p in container.find_all('p'):
+        text = _SPACES.sub(' ', p.get_text(' ', strip=True))
+        if len(text) >= LEAD_MIN_CHARS:
+            info['lead'] = text[:LEAD_MAX_CHARS]
+            break
+    if not info['lead']:
+        description = soup.find('meta', attrs={'name': 'description'}) or soup.find('meta', property='og:description')
+        if description and description.get('content'):
+            info['lead'] = _SPACES.sub(' ', description['content']).strip()[:LEAD_MAX_CHARS]
+    return info
+
+
+class ArticleEnricher:
+    """抓取新文章页面补充 canonical URL、发布时间和导语
+
+    全局并发和单个主机的并发都有上限，每个页面只流式读取前 max_bytes 字节；
+    结果写入缓存文件，同一个 URL 在缓存有效期内只抓一次。4xx 之类的永久失败同样缓存，
+    暂时性失败记下重试时间，到期后再抓。
+    """
+    def __init__(self, http=None, cache_file: Optional[str] = 'enrichment_cache.json',
+                 concurrency: int = 8, per_host: int = 2, max_bytes: int = DEFAULT_MAX_BYTES,
+                 timeout: float = 15):
+        self.http = http or requests
+        self.cache_file = cache_file
+        self.per_host = per_host
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.cache: Dict[str, Dict] = self._load_cache()
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.fetched = 0
+        self.cache_hits = 0
+
+    def _load_cache(self) -> Dict[str, Dict]:
+        try:
+            if self.cache_file and Path(self.cache_file).exists():
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    cache = json.load(f)
+                # 只保留最近7天的记录
+                cutoff = time.time() - CACHE_DAYS * 86400
+                return {url: info for url, info in cache.items() if info.get('fetched_at', 0) >= cutoff}
+        except Exception as e:
+            logging.warning(f"加载补充缓存失败: {str(e)}")
+        return {}
+
+    def save(self) -> None:
+        if not self.cache_file:
+            return
+        try:
+            with open(self.cache_file, 'w', encoding='utf-8') as f:
+                json.dump(self.cache, f, ensure_ascii=False)
+        except Exception as e:
+            logging.error(f"保存补充缓存失败: {str(e)}")
+        logging.info(f"文章补充: 抓取 {self.fetched} 个页面，缓存命中 {self.cache_hits} 次")
+
+    def _read_page(self, url: str) -> Optional[bytes]:
+        """流式读取页面开头，超过上限后直接断开连接"""
+        response = self.http.get(url, timeout=self.timeout, stream=True,
+                                 headers={'Accept': 'text/html,application/xhtml+xml'})
+        try:
+            response.raise_for_status()
+            if 'html' not in response.headers.get('content-type', 'text/html'):
+                return None
+            chunks = []
+            size = 0
+            for chunk in response.iter_content(chunk_size=8192):
+                chunks.append(chunk)
+                size += len(chunk)
+                if size >= self.max_bytes:
+                    break
+            return b''.join(chunks)[:self.max_bytes]
+        finally:
+            response.close()
+
+    def _fetch(self, url: str) -> Dict:
+        now = int(time.time())
+        try:
+            body = self._read_page(url)
+            info = extract_article(body, url) if body else {}
+        except requests.HTTPError as e:
+            logging.debug(f"补充文章失败 {url}: {str(e)}")
+            info = {'error': str(e)[:200]}
+            status = e.response.status_code if e.response is not None else None
+            if status is None or status >= 500 or status in TRANSIENT_STATUS_CODES:
+                info['retry_at'] = now + RETRY_DELAY
+        except Exception as e:
+            # 超时、连接错误等
+            logging.debug(f"补充文章失败 {url}: {str(e)}")
+            info = {'error': str(e)[:200], 'retry_at': now + RETRY_DELAY}
+        info['fetched_at'] = now
+        return info
+
+    async def _lookup(self, url: str) -> Dict:
+        cached = self.cache.get(url)
+        # 暂时性失败到了重试时间才重新抓取
+        if cached is not None and cached.get('retry_at', float('inf')) > time.time():
+            self.cache_hits += 1
+            return cached
+        # 同一个 URL 并发出现时共用一次请求
+        if url in self._inflight:
+            return await self._inflight[url]
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[url] = future
+        host = urlsplit(url).netloc
+        host_semaphore = self._host_semaphores.setdefault(host, asyncio.Semaphore(self.per_host))
+        try:
+            # 先占主机名额再占全局名额，避免全局名额被排队等同一主机的请求占满
+            async with host_semaphore, self._semaphore:
+                info = await asyncio.to_thread(self._fetch, url)
+            self.fetched += 1
+            self.cache[url] = info
+            future.set_result(info)
+            return info
+        finally:
+            del self._inflight[url]
+            if not future.done():
+                future.cancel()
+
+    async def enrich(self, items: List[NewsItem]) -> None:
+        """并发补充一批结果，已有发布时间的条目不覆盖"""
+        infos = await asyncio.gather(*(self._lookup(item.url) for item in items))
+        for item, info in zip(items, infos):
+            item.canonical_url = info.get('canonical_url') or item.canonical_url
+            item.lead = info.get('lead') or item.lead
+            if not item.publish_ts:
+                item.publish_ts = info.get('publish_ts') or 0
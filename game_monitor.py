@@ -1,12 +1,14 @@
 import asyncio
 import random
+import re
 import time
+from contextlib import nullcontext
 from datetime import datetime
-import pandas as pd
 import logging
 from pathlib import Path
 from playwright.async_api import async_playwright, Browser, Page
 from typing import List, Dict, Optional
+import csv
 import json
 import signal
 import sys
@@ -14,6 +16,17 @@ import requests
 from bs4 import BeautifulSoup
 from fake_useragent import UserAgent
 import os
+import argparse
+from network_replay import NetworkRecorder, NetworkReplayer, RecordingTransport, ReplayTransport
+from profiling import RunProfiler
+from pipeline import CrawlPipeline
+from engine_health import (BING_BLOCK_MARKERS, GOOGLE_BLOCK_MARKERS, BlockedError, CircuitBreaker,
+                           PageLayoutError, detect_block)
+from scheduler import BudgetScheduler
+from records import CSV_FIELDS, NewsItem, intern
+from news_index import NewsIndex
+from enrichment import ArticleEnricher
+from proxy_pool import Proxy, ProxyPool
 
 # 配置日志
 logging.basicConfig(
@@ -25,117 +38,212 @@ logging.basicConfig(
     ]
 )
 
+_SPACES = re.compile(r'\s+')
+
+
+def element_text(elem) -> str:
+    """取元素文本，行内标签（如 <em>）之间补空格并合并连续空白"""
+    return _SPACES.sub(' ', elem.get_text(' ', strip=True))
+
+
 class SearchEngine:
-    """搜索引擎基类"""
-    def __init__(self, context=None):
+    """搜索引擎基类，抓取(fetch)和解析(parse)分开，便于流水线中分别调度"""
+    # 为 True 时要解析后才知道这次抓取是否有效，熔断器的结果由 record_parse 记录
+    verify_in_parse = False
+    def __init__(self, context=None, http=None, throttle=True):
         self.context = context
+        self.http = http or requests
+        self.throttle = throttle
         self.ua = UserAgent()
+        self.breaker = CircuitBreaker(self.__class__.__name__)
+        # 有运行时间预算时由 GameMonitor 注入，根据剩余预算缩短单个请求的超时
+        self.timeout_provider = None
+        # 配置了代理池时由 GameMonitor 注入，context_provider 返回使用指定出口的浏览器上下文
+        self.proxy_pool: Optional[ProxyPool] = None
+        self.context_provider = None
+
+    def _timeout(self, default: float) -> float:
+        """单个请求的超时（秒）"""
+        if self.timeout_provider:
+            return self.timeout_provider(default)
+        return default
+
+    def supports(self, site: str) -> bool:
+        """是否能查询该站点，不支持时调用方不必排队等待限速"""
+        return True
+
+    def breaker_for(self, site: str) -> CircuitBreaker:
+        """该站点查询所用的熔断器，搜索引擎整体共用一个"""
+        return self.breaker
 
-    async def search(self, site: str, time_range: str) -> List[Dict]:
+    def available(self, site: str) -> bool:
+        return self.breaker_for(site).available()
+
+    async def _pause(self, low: float, high: float) -> None:
+        """请求之间的随机等待，回放模式下跳过"""
+        if self.throttle:
+            await asyncio.sleep(random.uniform(low, high))
+
+    async def _choose_proxy(self) -> Optional[Proxy]:
+        """从代理池选择出口，顺便探测冷却到期的出口；没有代理池时返回 None"""
+        if not self.proxy_pool:
+            return None
+        await self.proxy_pool.reprobe()
+        return self.proxy_pool.choose()
+
+    def _track(self, proxy: Optional[Proxy]):
+        """统计经过出口的请求结果，yield 出的函数在收到响应时调用以停止计时"""
+        if proxy is None:
+            return nullcontext(lambda: None)
+        return self.proxy_pool.track(proxy)
+
+    async def fetch(self, site: str, time_range: str) -> Optional[str]:
+        """获取结果页的 HTML，不支持该站点时返回 None"""
         raise NotImplementedError
 
-class GoogleSearch(SearchEngine):
-    """Google搜索实现"""
-    async def search(self, site: str, time_range: str) -> List[Dict]:
-        try:
-            if not self.context:
-                return []
+    def parse(self, html: str, site: str) -> List[NewsItem]:
+        """从结果页 HTML 中提取条目，纯 CPU 操作，可在线程中执行"""
+        raise NotImplementedError
 
-            page = await self.context.new_page()
-            tbs = 'qdr:d' if time_range == '24h' else 'qdr:w'
-            url = f'https://www.google.com/search?q=site:{site}&tbs={tbs}&num=20'
-            
-            await page.goto(url, timeout=60000)
-            await asyncio.sleep(random.uniform(5, 8))
-            
-            results = []
-            search_results = await page.query_selector_all('div.g')
-            
-            for result in search_results:
-                try:
-                    title_elem = await result.query_selector('h3')
-                    if not title_elem:
-                        continue
-                    title = await title_elem.inner_text()
-                    
-                    link_elem = await result.query_selector('a')
-                    if not link_elem:
-                        continue
-                    url = await link_elem.get_attribute('href')
-                    if not url or not url.startswith('http'):
-                        continue
-                        
-                    snippet_elem = await result.query_selector('div.VwiC3b')
-                    snippet = await snippet_elem.inner_text() if snippet_elem else ''
-                    
-                    results.append({
-                        'title': title,
-                        'url': url,
-                        'snippet': snippet
-                    })
-                except Exception as e:
-                    logging.warning(f"Error extracting result: {str(e)}")
-                    continue
-            
-            await page.close()
-            return results
+    def record_parse(self, site: str, error: Optional[Exception]) -> None:
+        """解析结束后在事件循环中调用，verify_in_parse 的引擎在这里把结果计入熔断器"""
+        if not self.verify_in_parse:
+            return
+        breaker = self.breaker_for(site)
+        if error:
+            breaker.record_failure(str(error))
+        else:
+            breaker.record_success()
+
+    async def guarded_fetch(self, site: str, time_range: str) -> Optional[str]:
+        """经过熔断器的抓取，熔断期间直接返回 None，失败和拦截都会计入熔断器"""
+        breaker = self.breaker_for(site)
+        if not breaker.allow():
+            logging.info(f"{breaker.name} 熔断中，跳过 {site}")
+            return None
+        try:
+            html = await self.fetch(site, time_range)
+        except BlockedError as e:
+            # 使用代理池时拦截通常只针对某个出口，由代理池剔除该出口，熔断器按普通失败计数
+            if self.proxy_pool:
+                breaker.record_failure(str(e))
+            else:
+                breaker.record_block(str(e))
+            raise
         except Exception as e:
-            logging.error(f"Google search error: {str(e)}")
+            breaker.record_failure(str(e))
+            raise
+        if not html or not self.verify_in_parse:
+            breaker.record_success()
+        return html
+
+    async def search(self, site: str, time_range: str) -> List[NewsItem]:
+        """抓取并解析，失败时抛出异常，调用方据此区分没有结果和请求失败"""
+        html = await self.guarded_fetch(site, time_range)
+        if not html:
             return []
+        try:
+            results = await asyncio.to_thread(self.parse, html, site)
+        except Exception as e:
+            self.record_parse(site, e)
+            raise
+        self.record_parse(site, None)
+        return results
 
-class BingSearch(SearchEngine):
-    """Bing搜索实现"""
-    async def search(self, site: str, time_range: str) -> List[Dict]:
+class BrowserSearchEngine(SearchEngine):
+    """通过浏览器访问搜索结果页的引擎"""
+    result_selector = ''
+    title_selector = ''
+    snippet_selector = ''
+    # 该引擎拦截页面的特征文本
+    block_markers = ()
+
+    def _build_url(self, site: str, time_range: str) -> str:
+        raise NotImplementedError
+
+    async def fetch(self, site: str, time_range: str) -> Optional[str]:
+        if not self.context:
+            return None
+
+        proxy = await self._choose_proxy()
+        context = await self.context_provider(proxy) if self.context_provider else self.context
+        page = await context.new_page()
         try:
-            if not self.context:
-                return []
+            # 只有传输错误、拦截状态码和跳转到验证页计入出口评分
+            with self._track(proxy) as received:
+                response = await page.goto(self._build_url(site, time_range), timeout=self._timeout(60) * 1000)
+                received()
+                reason = detect_block(page.url, response.status if response else None, None)
+                if reason:
+                    raise BlockedError(reason)
 
-            page = await self.context.new_page()
-            freshness = 'Day' if time_range == '24h' else 'Week'
-            url = f'https://www.bing.com/search?q=site:{site}&filters=ex1:"ez5_{freshness}"'
-            
-            await page.goto(url, timeout=60000)
-            await asyncio.sleep(random.uniform(5, 8))
-            
-            results = []
-            search_results = await page.query_selector_all('li.b_algo')
-            
-            for result in search_results:
-                try:
-                    title_elem = await result.query_selector('h2')
-                    if not title_elem:
-                        continue
-                    title = await title_elem.inner_text()
-                    
-                    link_elem = await result.query_selector('a')
-                    if not link_elem:
-                        continue
-                    url = await link_elem.get_attribute('href')
-                    if not url or not url.startswith('http'):
-                        continue
-                        
-                    snippet_elem = await result.query_selector('div.b_caption p')
-                    snippet = await snippet_elem.inner_text() if snippet_elem else ''
-                    
-                    results.append({
-                        'title': title,
-                        'url': url,
-                        'snippet': snippet
-                    })
-                except Exception as e:
-                    logging.warning(f"Error extracting result: {str(e)}")
-                    continue
-            
+            await self._pause(5, 8)
+            html = await page.content()
+            reason = detect_block(page.url, None, html, self.block_markers)
+            if reason:
+                raise BlockedError(reason)
+            return html
+        finally:
             await page.close()
-            return results
-        except Exception as e:
-            logging.error(f"Bing search error: {str(e)}")
-            return []
+
+    def parse(self, html: str, site: str) -> List[NewsItem]:
+        soup = BeautifulSoup(html, 'html.parser')
+        engine_name = self.__class__.__name__
+        results = []
+
+        for result in soup.select(self.result_selector):
+            try:
+                title_elem = result.select_one(self.title_selector)
+                if not title_elem:
+                    continue
+
+                link_elem = result.select_one('a')
+                if not link_elem:
+                    continue
+                url = link_elem.get('href', '')
+                if not url or not url.startswith('http'):
+                    continue
+
+                snippet_elem = result.select_one(self.snippet_selector)
+                results.append(NewsItem(
+                    title=element_text(title_elem),
+                    url=url,
+                    snippet=element_text(snippet_elem) if snippet_elem else '',
+                    engine=engine_name
+                ))
+            except Exception as e:
+                logging.warning(f"Error extracting result: {str(e)}")
+                continue
+
+        return results
+
+class GoogleSearch(BrowserSearchEngine):
+    """Google搜索实现"""
+    result_selector = 'div.g'
+    title_selector = 'h3'
+    snippet_selector = 'div.VwiC3b'
+    block_markers = GOOGLE_BLOCK_MARKERS
+
+    def _build_url(self, site: str, time_range: str) -> str:
+        tbs = 'qdr:d' if time_range == '24h' else 'qdr:w'
+        return f'https://www.google.com/search?q=site:{site}&tbs={tbs}&num=20'
+
+class BingSearch(BrowserSearchEngine):
+    """Bing搜索实现"""
+    result_selector = 'li.b_algo'
+    title_selector = 'h2'
+    snippet_selector = 'div.b_caption p'
+    block_markers = BING_BLOCK_MARKERS
+
+    def _build_url(self, site: str, time_range: str) -> str:
+        freshness = 'Day' if time_range == '24h' else 'Week'
+        return f'https://www.bing.com/search?q=site:{site}&filters=ex1:"ez5_{freshness}"'
 
 class DirectSiteSearch(SearchEngine):
     """直接访问网站实现"""
-    def __init__(self, context=None):
-        super().__init__(context)
+    verify_in_parse = True
+    def __init__(self, context=None, http=None, throttle=True):
+        super().__init__(context, http, throttle)
         self.site_patterns = {
             '3dmgame.com': {
                 'url': 'https://www.3dmgame.com/news/',
@@ -153,64 +261,124 @@ class DirectSiteSearch(SearchEngine):
             }
             # 可以继续添加其他网站的模式
         }
+        # 直接访问时每个网站各自熔断，一个网站拦截不影响其他网站
+        self.site_breakers: Dict[str, CircuitBreaker] = {}
 
-    async def search(self, site: str, time_range: str) -> List[Dict]:
-        try:
-            if site not in self.site_patterns:
-                return []
+    def supports(self, site: str) -> bool:
+        return site in self.site_patterns
 
-            pattern = self.site_patterns[site]
-            headers = {'User-Agent': self.ua.random}
-            response = requests.get(pattern['url'], headers=headers, timeout=30)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            results = []
-            
-            for item in soup.select(pattern['list_selector'])[:20]:
-                try:
-                    title_elem = item.select_one(pattern['title_selector'])
-                    if not title_elem:
-                        continue
-                        
-                    link_elem = item.select_one(pattern['link_selector'])
-                    if not link_elem:
-                        continue
-                        
-                    snippet_elem = item.select_one(pattern['snippet_selector'])
+    def breaker_for(self, site: str) -> CircuitBreaker:
+        if site not in self.site_breakers:
+            self.site_breakers[site] = CircuitBreaker(f'{self.__class__.__name__}[{site}]')
+        return self.site_breakers[site]
+
+    async def fetch(self, site: str, time_range: str) -> Optional[str]:
+        if site not in self.site_patterns:
+            return None
+
+        pattern = self.site_patterns[site]
+        headers = {'User-Agent': self.ua.random}
+        proxy = await self._choose_proxy()
+        kwargs = {'proxies': proxy.requests_proxies()} if proxy else {}
+        # 只有传输错误、拦截状态码和跳转到验证页计入出口评分
+        with self._track(proxy) as received:
+            # requests 是同步的，放到线程中执行以免阻塞事件循环
+            response = await asyncio.to_thread(self.http.get, pattern['url'], headers=headers,
+                                               timeout=self._timeout(30), **kwargs)
+            received()
+            reason = detect_block(response.url, response.status_code, None)
+            if reason:
+                raise BlockedError(reason)
+        # 源站的 404/5xx 与出口无关
+        response.raise_for_status()
+        # 解码可能要检测编码，和解析一样放到线程中
+        html = await asyncio.to_thread(lambda: response.text)
+        return html
+
+    def parse(self, html: str, site: str) -> List[NewsItem]:
+        pattern = self.site_patterns[site]
+        soup = BeautifulSoup(html, 'html.parser')
+        results = []
+
+        # 新闻页面不按特征文本判断拦截；找不到列表时作为普通失败交给熔断器
+        items = soup.select(pattern['list_selector'])
+        if not items:
+            raise PageLayoutError(f"页面中没有 {pattern['list_selector']}")
+        for item in items[:20]:
+            try:
+                title_elem = item.select_one(pattern['title_selector'])
+                if not title_elem:
+                    continue
                     
-                    results.append({
-                        'title': title_elem.get_text(strip=True),
-                        'url': link_elem.get('href', ''),
-                        'snippet': snippet_elem.get_text(strip=True) if snippet_elem else ''
-                    })
-                except Exception as e:
-                    logging.warning(f"Error extracting result from {site}: {str(e)}")
+                link_elem = item.select_one(pattern['link_selector'])
+                if not link_elem:
                     continue
-            
-            return results
-        except Exception as e:
-            logging.error(f"Direct site search error for {site}: {str(e)}")
-            return []
+                    
+                snippet_elem = item.select_one(pattern['snippet_selector'])
+                
+                results.append(NewsItem(
+                    title=element_text(title_elem),
+                    url=link_elem.get('href', ''),
+                    snippet=element_text(snippet_elem) if snippet_elem else '',
+                    engine='DirectSiteSearch'
+                ))
+            except Exception as e:
+                logging.warning(f"Error extracting result from {site}: {str(e)}")
+                continue
+        
+        return results
 
 class GameMonitor:
-    def __init__(self):
-        self.sites = self._load_sites()
+    def __init__(self, record_dir: Optional[str] = None, replay_dir: Optional[str] = None,
+                 profiler: Optional[RunProfiler] = None, sites: Optional[List[str]] = None,
+                 handle_signals: bool = True, budget_minutes: Optional[float] = None,
+                 enrich: bool = False):
+        self.sites = sites if sites is not None else self._load_sites()
+        self.profiler = profiler or RunProfiler()
         self.browser: Optional[Browser] = None
         self.context = None
         self.results_file = None
         self.progress_file = 'progress.json'
         self.history_file = 'url_history.json'
+        self.run_status_file = 'run_status.json'
         self.current_site_index = 0
         self.completed_sites = set()
-        self.processed_urls = self._load_url_history()
+
+        # 录制/回放网络流量，回放模式下不读写进度和历史，保证每次运行输入一致
+        self.recorder = NetworkRecorder(record_dir) if record_dir else None
+        self.replayer = NetworkReplayer(replay_dir) if replay_dir else None
+        self.persist_state = self.replayer is None
+        self.throttle = self.replayer is None
+        if self.recorder:
+            self.http = RecordingTransport(self.recorder)
+        elif self.replayer:
+            self.http = ReplayTransport(self.replayer)
+        else:
+            self.http = requests
+
+        self.processed_urls = self._load_url_history() if self.persist_state else set()
+        # 保存结果时同步更新全文索引
+        self.news_index = NewsIndex() if self.persist_state else None
+        # PROXY_POOL 中配置的出口由直接访问和浏览器共用，回放模式下不走网络
+        self.proxy_pool = ProxyPool.from_env() if self.replayer is None else None
+        self.proxy_contexts: Dict[str, object] = {}
+        # 可选的文章补充阶段，回放模式下不读写缓存，保证每次都走录制的响应
+        self.enricher = ArticleEnricher(
+            self.http, cache_file='enrichment_cache.json' if self.persist_state else None
+        ) if enrich else None
         self.is_interrupted = False
         self.force_quit = False
         self.search_engines = []
+        # 多进程模式下由协调进程注入的全局限速器
+        self.rate_limiter = None
+        # 运行时间预算，用尽时提前结束并生成部分报告
+        self.scheduler = BudgetScheduler(budget_minutes * 60) if budget_minutes else None
+        self.budget_exhausted = False
         
         # 设置信号处理
-        signal.signal(signal.SIGINT, self._signal_handler)
-        signal.signal(signal.SIGTERM, self._signal_handler)
+        if handle_signals:
+            signal.signal(signal.SIGINT, self._signal_handler)
+            signal.signal(signal.SIGTERM, self._signal_handler)
 
     def _load_sites(self) -> List[str]:
         """加载要监控的网站列表"""
@@ -241,6 +409,8 @@ class GameMonitor:
 
     def _save_url_history(self):
         """保存已处理的URL历史记录"""
+        if not self.persist_state:
+            return
         try:
             current_time = datetime.now().isoformat()
             history = {url: current_time for url in self.processed_urls}
@@ -249,52 +419,64 @@ class GameMonitor:
         except Exception as e:
             logging.error(f"保存URL历史记录失败: {str(e)}")
 
-    def _is_new_content(self, url: str, publish_time: Optional[str] = None) -> bool:
+    def _is_new_content(self, url: str, publish_ts: int = 0, now: Optional[int] = None) -> bool:
         """判断是否为新内容"""
         # 如果URL已经处理过，则不是新内容
         if url in self.processed_urls:
             return False
             
         # 如果提供了发布时间，检查是否在24小时内
-        if publish_time:
-            try:
-                pub_time = datetime.fromisoformat(publish_time)
-                time_diff = datetime.now() - pub_time
-                if time_diff.days > 1:  # 超过24小时
-                    return False
-            except Exception as e:
-                logging.warning(f"解析发布时间失败: {str(e)}")
+        if publish_ts:
+            now = now or int(time.time())
+            if now - publish_ts >= 2 * 86400:  # 超过24小时（按整天计算）
+                return False
                 
         return True
 
-    async def _process_search_results(self, results: List[Dict], site: str) -> List[Dict]:
+    async def _process_search_results(self, results: List[NewsItem], site: str,
+                                      time_range: str = '') -> List[NewsItem]:
         """处理搜索结果，过滤已处理的内容"""
         new_results = []
+        site = intern(site)
+        window = intern(time_range)
+        found_ts = int(time.time())
         for result in results:
-            url = result.get('url', '')
-            publish_time = result.get('publish_time')  # 如果搜索引擎或直接访问能获取到发布时间
-            
-            if self._is_new_content(url, publish_time):
-                result.update({
-                    'site': site,
-                    'found_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                })
+            # publish_ts 在搜索引擎或直接访问能获取到发布时间时才有值
+            if self._is_new_content(result.url, result.publish_ts, found_ts):
+                result.site = site
+                result.window = window
+                result.found_ts = found_ts
                 new_results.append(result)
-                self.processed_urls.add(url)
+                self.processed_urls.add(result.url)
                 
         return new_results
 
-    async def search_new_pages(self, site: str, time_range: str) -> List[Dict]:
-        """使用多个搜索引擎尝试获取结果"""
+    async def search_new_pages(self, site: str, time_range: str,
+                               require_success: bool = False) -> List[NewsItem]:
+        """使用多个搜索引擎尝试获取结果
+
+        require_success 为 True 时，如果没有任何引擎请求成功（都失败或都在熔断中）则抛出异常，
+        供需要重试任务的调用方使用
+        """
         all_results = []
         success = False
+        # 至少一个引擎完成了请求，结果可以为空
+        searched = False
         
         for engine in self.search_engines:
+            if not engine.supports(site):
+                continue
+            if not engine.available(site):
+                logging.info(f"{engine.__class__.__name__} 熔断中，跳过 {site}")
+                continue
             try:
+                if self.rate_limiter:
+                    await self.rate_limiter.wait(engine.__class__.__name__)
                 results = await engine.search(site, time_range)
+                searched = True
                 if results:
                     # 过滤并处理新内容
-                    new_results = await self._process_search_results(results, site)
+                    new_results = await self._process_search_results(results, site, time_range)
                     all_results.extend(new_results)
                     logging.info(f"从 {site} 使用 {engine.__class__.__name__} 获取到 {len(new_results)} 条新内容")
                     success = True
@@ -308,6 +490,8 @@ class GameMonitor:
                 
         if not success:
             logging.warning(f"所有搜索引擎都未能从 {site} 获取到结果")
+        if require_success and not searched:
+            raise RuntimeError(f"没有搜索引擎成功完成 {site} ({time_range}) 的请求")
             
         # 对结果进行去重和排序
         unique_results = self._deduplicate_results(all_results)
@@ -315,31 +499,22 @@ class GameMonitor:
         
         return sorted_results
         
-    def _deduplicate_results(self, results: List[Dict]) -> List[Dict]:
+    def _deduplicate_results(self, results: List[NewsItem]) -> List[NewsItem]:
         """对结果进行去重"""
         seen_urls = set()
         unique_results = []
         
         for result in results:
-            url = result.get('url', '')
+            url = result.url
             if url and url not in seen_urls:
                 seen_urls.add(url)
                 unique_results.append(result)
                 
         return unique_results
         
-    def _sort_results_by_time(self, results: List[Dict]) -> List[Dict]:
-        """按发布时间排序结果"""
-        def get_time(result):
-            try:
-                time_str = result.get('publish_time', '')
-                if time_str:
-                    return datetime.fromisoformat(time_str)
-                return datetime.min
-            except Exception:
-                return datetime.min
-                
-        return sorted(results, key=get_time, reverse=True)
+    def _sort_results_by_time(self, results: List[NewsItem]) -> List[NewsItem]:
+        """按发布时间排序结果，没有发布时间的排在最后"""
+        return sorted(results, key=lambda result: result.publish_ts, reverse=True)
         
     async def _init_browser(self):
         """初始化浏览器"""
@@ -389,7 +564,10 @@ class GameMonitor:
                     'args': config['args']
                 }
                 
-                if config['proxy']:
+                if self.proxy_pool and config['launch_type'] == 'chromium':
+                    # 使用代理池时每个上下文各自指定代理，Chromium 需要以 per-context 方式启动
+                    launch_args['proxy'] = {'server': 'per-context'}
+                elif config['proxy']:
                     launch_args['proxy'] = config['proxy']
                 
                 if config['launch_type'] == 'chromium':
@@ -398,15 +576,14 @@ class GameMonitor:
                     self.browser = await playwright.firefox.launch(**launch_args)
                     
                 # 创建上下文并设置用户代理
-                self.context = await self.browser.new_context(
-                    user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
-                    viewport={'width': 1920, 'height': 1080}
-                )
+                self.context = await self._new_context()
                 
-                # 测试连接
+                # 测试连接，只检验浏览器本身，不经过代理池出口，单个出口不可用不应让整个配置失败
                 page = await self.context.new_page()
-                await page.goto('https://www.google.com', timeout=30000)
-                await page.close()
+                try:
+                    await page.goto('https://www.google.com', timeout=30000)
+                finally:
+                    await page.close()
                 
                 logging.info(f"成功使用配置: {config['launch_type']}")
                 await self._init_search_engines()
@@ -415,18 +592,61 @@ class GameMonitor:
             except Exception as e:
                 last_error = e
                 logging.warning(f"配置 {config['launch_type']} 失败: {str(e)}")
+                self.proxy_contexts.clear()
                 if self.browser:
                     await self.browser.close()
                     
         raise Exception(f"所有浏览器配置都失败。最后的错误: {str(last_error)}")
 
+    async def _new_context(self, proxy: Optional[Proxy] = None):
+        """创建浏览器上下文，录制/回放模式下挂上网络拦截"""
+        options = {
+            'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
+            'viewport': {'width': 1920, 'height': 1080}
+        }
+        if proxy and proxy.playwright_proxy():
+            options['proxy'] = proxy.playwright_proxy()
+        context = await self.browser.new_context(**options)
+        if self.recorder:
+            await self.recorder.attach(context)
+        elif self.replayer:
+            await self.replayer.attach(context)
+        return context
+
+    async def _context_for(self, proxy: Optional[Proxy]):
+        """每个出口一个浏览器上下文，首次使用时创建"""
+        if proxy is None or not proxy.playwright_proxy():
+            return self.context
+        if proxy.url not in self.proxy_contexts:
+            self.proxy_contexts[proxy.url] = await self._new_context(proxy)
+        return self.proxy_contexts[proxy.url]
+
     async def _init_search_engines(self):
         """初始化搜索引擎"""
         self.search_engines = [
-            DirectSiteSearch(self.context),  # 直接访问放在第一位
-            GoogleSearch(self.context),
-            BingSearch(self.context)
+            DirectSiteSearch(self.context, self.http, self.throttle),  # 直接访问放在第一位
+            GoogleSearch(self.context, self.http, self.throttle),
+            BingSearch(self.context, self.http, self.throttle)
         ]
+        if self.scheduler:
+            for engine in self.search_engines:
+                engine.timeout_provider = self.scheduler.request_timeout
+        if self.proxy_pool:
+            for engine in self.search_engines:
+                engine.proxy_pool = self.proxy_pool
+                engine.context_provider = self._context_for
+
+    def _remaining_budget(self) -> Optional[float]:
+        return self.scheduler.budget.remaining() if self.scheduler else None
+
+    async def _pause(self, low: float, high: float) -> None:
+        """站点和批次之间的随机等待，回放模式下跳过，不会超出剩余预算"""
+        if self.throttle:
+            wait_time = random.uniform(low, high)
+            remaining = self._remaining_budget()
+            if remaining is not None:
+                wait_time = min(wait_time, remaining)
+            await asyncio.sleep(wait_time)
 
     async def process_site_batch(self, sites: List[str]) -> None:
         """处理一批网站"""
@@ -434,48 +654,89 @@ class GameMonitor:
             if site in self.completed_sites or self.is_interrupted:
                 continue
                 
+            if self.scheduler and not self.scheduler.can_start_site():
+                self.budget_exhausted = True
+                break
+
             logging.info(f"Monitoring site: {site}")
             try:
-                results_24h = await self.search_new_pages(site, '24h')
-                if results_24h:
-                    self._save_results(results_24h)
-                
-                results_1w = await self.search_new_pages(site, '1w')
-                if results_1w:
-                    self._save_results(results_1w)
+                started = time.monotonic()
+                with self.profiler.stage(f'crawl.{site}'):
+                    new_items = await asyncio.wait_for(self._crawl_site(site), timeout=self._remaining_budget())
+                if self.scheduler:
+                    self.scheduler.record(site, new_items, time.monotonic() - started)
                 
                 self.completed_sites.add(site)
                 self._save_progress()
                 
-                await asyncio.sleep(random.uniform(10, 20))
+                await self._pause(10, 20)
                 
+            except asyncio.TimeoutError:
+                logging.warning(f"时间预算用尽，{site} 未完成")
+                self.budget_exhausted = True
+                break
             except Exception as e:
                 logging.error(f"Failed to process site {site}: {str(e)}")
                 continue
 
-    async def monitor_all_sites(self, batch_size=2):
-        """监控所有网站"""
+    async def _crawl_site(self, site: str) -> int:
+        """爬取单个站点的两个时间窗口，返回新增条目数"""
+        new_items = 0
+        for time_range in ('24h', '1w'):
+            results = await self.search_new_pages(site, time_range)
+            if results:
+                if self.enricher:
+                    await self.enricher.enrich(results)
+                self._save_results(results)
+                new_items += len(results)
+        return new_items
+
+    async def monitor_all_sites(self, batch_size=2, pipeline: Optional[CrawlPipeline] = None):
+        """监控所有网站，传入 pipeline 时改用分阶段流水线处理"""
         try:
             # 加载之前的进度
             self._load_progress()
             
+            # 有时间预算时，历史收益高的站点优先。进度中的下标是按旧顺序保存的，重排后不再适用，
+            # 改为从头开始、只靠 completed_sites 跳过；已完成的站点排到最后
+            if self.scheduler:
+                pending = [s for s in self.sites if s not in self.completed_sites]
+                self.sites = self.scheduler.order(pending) + [s for s in self.sites if s in self.completed_sites]
+                self.current_site_index = 0
+
             # 初始化浏览器
-            await self._init_browser()
+            with self.profiler.stage('browser_init'):
+                await self._init_browser()
+
+            if pipeline:
+                with self.profiler.stage('pipeline'):
+                    try:
+                        await asyncio.wait_for(pipeline.run(self.sites), timeout=self._remaining_budget())
+                    except asyncio.TimeoutError:
+                        logging.warning("时间预算用尽，流水线提前结束")
+                        self.budget_exhausted = True
+                return
             
             # 从上次的位置继续处理
             total_sites = len(self.sites)
             for i in range(self.current_site_index, total_sites, batch_size):
-                if self.is_interrupted:
+                if self.is_interrupted or self.budget_exhausted:
                     break
                     
                 self.current_site_index = i
                 batch = self.sites[i:i + batch_size]
+                if all(site in self.completed_sites for site in batch):
+                    continue
                 logging.info(f"Processing batch {i//batch_size + 1}/{(total_sites + batch_size - 1)//batch_size}")
                 
                 await self.process_site_batch(batch)
                 
-                if i + batch_size < total_sites and not self.is_interrupted:
+                remaining_sites = [s for s in self.sites[i + batch_size:] if s not in self.completed_sites]
+                if remaining_sites and not self.is_interrupted and self.throttle:
                     wait_time = random.uniform(60, 120)
+                    remaining = self._remaining_budget()
+                    if remaining is not None:
+                        wait_time = min(wait_time, remaining)
                     logging.info(f"Waiting {wait_time:.0f} seconds before next batch...")
                     await asyncio.sleep(wait_time)
                     
@@ -489,11 +750,25 @@ class GameMonitor:
                 
             if self.is_interrupted:
                 logging.info("Task interrupted. Progress saved. Run the script again to continue.")
+            elif self.budget_exhausted:
+                logging.info("Time budget exhausted. Partial results saved.")
             else:
                 logging.info("All sites processed successfully!")
                 
             # 完成后保存URL历史
             self._save_url_history()
+            self._save_run_status()
+            if self.scheduler:
+                self.scheduler.save_stats()
+            if self.enricher:
+                self.enricher.save()
+            if self.proxy_pool:
+                logging.info("代理池状态:\n" + self.proxy_pool.summary())
+
+            if self.recorder:
+                self.recorder.save()
+            if self.replayer and self.replayer.misses:
+                logging.warning(f"回放过程中有 {self.replayer.misses} 个请求未命中录制")
 
     def _signal_handler(self, signum, frame):
         """处理中断信号"""
@@ -511,6 +786,8 @@ class GameMonitor:
             # 保存进度
             self._save_progress()
             self._save_url_history()
+            if self.recorder:
+                self.recorder.save()
             
             # 关闭浏览器
             if self.browser:
@@ -539,6 +816,8 @@ class GameMonitor:
 
     def _load_progress(self) -> None:
         """加载进度"""
+        if not self.persist_state:
+            return
         try:
             if Path(self.progress_file).exists():
                 with open(self.progress_file, 'r', encoding='utf-8') as f:
@@ -551,6 +830,8 @@ class GameMonitor:
             
     def _save_progress(self) -> None:
         """保存进度"""
+        if not self.persist_state:
+            return
         try:
             progress = {
                 'last_site_index': self.current_site_index,
@@ -563,7 +844,23 @@ class GameMonitor:
         except Exception as e:
             logging.error(f"Error saving progress: {str(e)}")
 
-    def _save_results(self, results: List[Dict]) -> None:
+    def _save_run_status(self) -> None:
+        """记录本次运行是否完整，分析报告据此标注未覆盖的站点"""
+        if not self.persist_state:
+            return
+        try:
+            status = {
+                'finished_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'results_file': self.results_file,
+                'budget_exhausted': self.budget_exhausted,
+                'skipped_sites': [site for site in self.sites if site not in self.completed_sites]
+            }
+            with open(self.run_status_file, 'w', encoding='utf-8') as f:
+                json.dump(status, f, ensure_ascii=False, indent=4)
+        except Exception as e:
+            logging.error(f"保存运行状态失败: {str(e)}")
+
+    def _save_results(self, results: List[NewsItem]) -> None:
         """保存结果到CSV文件"""
         if not results:
             return
@@ -572,21 +869,72 @@ class GameMonitor:
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             self.results_file = f'game_news_{timestamp}.csv'
             
-        if not Path(self.results_file).exists():
-            df = pd.DataFrame(results)
-            df.to_csv(self.results_file, index=False, encoding='utf-8-sig')
-        else:
-            df = pd.DataFrame(results)
-            df.to_csv(self.results_file, mode='a', header=False, index=False, encoding='utf-8-sig')
+        # 新文件带 BOM 和表头，追加时只写数据行
+        is_new = not Path(self.results_file).exists()
+        with open(self.results_file, 'w' if is_new else 'a', newline='',
+                  encoding='utf-8-sig' if is_new else 'utf-8') as f:
+            writer = csv.writer(f)
+            if is_new:
+                writer.writerow(CSV_FIELDS)
+            writer.writerows(result.to_row() for result in results)
         
         logging.info(f"Results saved to {self.results_file}")
 
-async def main():
+        if self.news_index:
+            try:
+                self.news_index.add(results)
+            except Exception as e:
+                logging.error(f"更新全文索引失败: {str(e)}")
+
+async def main(record_dir: Optional[str] = None, replay_dir: Optional[str] = None,
+               profiler: Optional[RunProfiler] = None, workers: int = 1, use_pipeline: bool = False,
+               budget_minutes: Optional[float] = None, enrich: bool = False):
     try:
-        monitor = GameMonitor()
-        await monitor.monitor_all_sites(batch_size=2)
+        if profiler:
+            profiler.watch_event_loop()
+        if workers > 1:
+            from parallel_crawl import ParallelCrawler
+            await ParallelCrawler(workers=workers).crawl()
+            return
+        monitor = GameMonitor(record_dir=record_dir, replay_dir=replay_dir, profiler=profiler,
+                              budget_minutes=budget_minutes, enrich=enrich)
+        enricher = monitor.enricher.enrich if monitor.enricher else None
+        pipeline = CrawlPipeline(monitor, enricher=enricher) if use_pipeline else None
+        await monitor.monitor_all_sites(batch_size=2, pipeline=pipeline)
     except Exception as e:
         logging.error(f"Main program error: {str(e)}")
 
+def parse_args():
+    parser = argparse.ArgumentParser(description='游戏网站新内容监控')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--record', metavar='DIR', help='录制所有网络响应到指定目录')
+    mode.add_argument('--replay', metavar='DIR', help='从录制目录回放网络响应，不访问网络')
+    parser.add_argument('--profile', metavar='DIR', help='开启性能分析，结果写入指定目录')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='爬虫进程数，大于1时每个进程独占一个浏览器，0表示使用全部CPU核心')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='使用分阶段流水线（抓取/解析/去重/补充/写入并行）代替逐站点顺序处理')
+    parser.add_argument('--budget', type=float, metavar='MINUTES',
+                        help='整次运行的时间预算（分钟），用尽时提前结束并生成部分报告')
+    parser.add_argument('--enrich', action='store_true',
+                        help='抓取新文章页面补充 canonical URL、发布时间和导语')
+    args = parser.parse_args()
+    if args.workers == 0:
+        args.workers = os.cpu_count() or 1
+    if args.workers > 1 and (args.record or args.replay):
+        parser.error('--workers 不能与 --record/--replay 同时使用')
+    if args.workers > 1 and args.enrich:
+        parser.error('--enrich 暂不支持多进程模式')
+    if args.workers > 1 and args.budget:
+        parser.error('--budget 暂不支持多进程模式')
+    return args
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    args = parse_args()
+    profiler = RunProfiler(args.profile)
+    try:
+        asyncio.run(main(record_dir=args.record, replay_dir=args.replay, profiler=profiler,
+                         workers=args.workers, use_pipeline=args.pipeline, budget_minutes=args.budget,
+                         enrich=args.enrich))
+    finally:
+        profiler.close()
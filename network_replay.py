@@ -0,0 +1,248 @@
+import hashlib
+import json
+import logging
+import time
+from collections import defaultdict, deque
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# 录制时直接丢弃的资源类型，回放时同样丢弃，保证两种模式下页面行为一致
+SKIPPED_RESOURCE_TYPES = {'image', 'media', 'font'}
+
+# 录制的响应体已被解码，回放时不能再带上这些头
+_DROPPED_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding'}
+
+# urllib3 的 raw.version 与 HAR httpVersion 的对应关系
+_HTTP_VERSIONS = {10: 'HTTP/1.0', 11: 'HTTP/1.1'}
+
+
+class NetworkRecorder:
+    """录制浏览器导航和HTTP请求的响应，保存为HAR文件加响应体目录"""
+    def __init__(self, record_dir: str):
+        self.record_dir = Path(record_dir)
+        self.bodies_dir = self.record_dir / 'bodies'
+        self.bodies_dir.mkdir(parents=True, exist_ok=True)
+        self.har_file = self.record_dir / 'recording.har'
+        self.entries: List[Dict] = []
+
+    def add_entry(self, method: str, url: str, status: int, status_text: str,
+                  headers: Dict[str, str], body: bytes, elapsed: float,
+                  request_headers: Optional[Dict[str, str]] = None, http_version: str = 'HTTP/1.1') -> None:
+        """记录一次请求和响应，写出 HAR 1.2 要求的全部字段"""
+        # requests 保留服务器返回的大小写，统一转成小写，HAR 中的查找和回放都按小写处理
+        headers = {k.lower(): v for k, v in headers.items()}
+        request_headers = {k.lower(): v for k, v in (request_headers or {}).items()}
+        digest = hashlib.sha1(body).hexdigest()
+        body_path = self.bodies_dir / digest
+        if not body_path.exists():
+            body_path.write_bytes(body)
+
+        elapsed_ms = round(elapsed * 1000, 1)
+        self.entries.append({
+            'startedDateTime': datetime.now(timezone.utc).isoformat(),
+            'time': elapsed_ms,
+            'request': {
+                'method': method,
+                'url': url,
+                'httpVersion': http_version,
+                'cookies': [],
+                'headers': [{'name': k, 'value': v} for k, v in request_headers.items()],
+                'queryString': [{'name': k, 'value': v}
+                                for k, v in parse_qsl(urlsplit(url).query, keep_blank_values=True)],
+                'headersSize': -1,
+                'bodySize': 0 if method in ('GET', 'HEAD') else -1
+            },
+            'response': {
+                'status': status,
+                'statusText': status_text or '',
+                'httpVersion': http_version,
+                'cookies': [],
+                'headers': [{'name': k, 'value': v} for k, v in headers.items()],
+                'content': {
+                    'size': len(body),
+                    'mimeType': headers.get('content-type', ''),
+                    '_file': f'bodies/{digest}'
+                },
+                'redirectURL': headers.get('location', ''),
+                # 保存的是解码后的响应体，传输大小未知
+                'headersSize': -1,
+                'bodySize': -1
+            },
+            'cache': {},
+            # 只测了总耗时，全部记为等待时间
+            'timings': {'send': 0, 'wait': elapsed_ms, 'receive': 0}
+        })
+
+    async def attach(self, context) -> None:
+        """拦截浏览器上下文的所有请求并录制"""
+        await context.route('**/*', self._handle_route)
+
+    async def _handle_route(self, route) -> None:
+        request = route.request
+        if request.resource_type in SKIPPED_RESOURCE_TYPES:
+            await route.abort()
+            return
+
+        started = time.time()
+        try:
+            # 不自动跟随跳转，每一跳（如 google.com/sorry、consent.google.com）都单独录制，
+            # 浏览器收到 3xx 后自己发起下一跳请求，回放时按同样的顺序命中
+            response = await route.fetch(max_redirects=0)
+            body = await response.body()
+        except Exception as e:
+            logging.warning(f"录制请求失败 {request.url}: {str(e)}")
+            await route.abort()
+            return
+
+        self.add_entry(request.method, request.url, response.status, response.status_text,
+                       response.headers, body, time.time() - started, request_headers=request.headers)
+        await route.fulfill(response=response, body=body)
+
+    def save(self) -> None:
+        """写出HAR文件"""
+        har = {
+            'log': {
+                'version': '1.2',
+                'creator': {'name': 'GameNewsMonitor', 'version': '1.0'},
+                'entries': self.entries
+            }
+        }
+        with open(self.har_file, 'w', encoding='utf-8') as f:
+            json.dump(har, f, ensure_ascii=False, indent=2)
+        logging.info(f"已录制 {len(self.entries)} 个请求到 {self.har_file}")
+
+
+class NetworkReplayer:
+    """从录制目录回放响应，不访问网络"""
+    def __init__(self, record_dir: str):
+        self.record_dir = Path(record_dir)
+        self.har_file = self.record_dir / 'recording.har'
+        self.responses: Dict[Tuple[str, str], deque] = defaultdict(deque)
+        self.misses = 0
+        self._load()
+
+    def _load(self) -> None:
+        with open(self.har_file, 'r', encoding='utf-8') as f:
+            har = json.load(f)
+
+        for entry in har['log']['entries']:
+            request = entry['request']
+            response = entry['response']
+            body = (self.record_dir / response['content']['_file']).read_bytes()
+            headers = {h['name']: h['value'] for h in response['headers']
+                       if h['name'].lower() not in _DROPPED_HEADERS}
+            key = (request['method'], request['url'])
+            self.responses[key].append((response['status'], response['statusText'], headers, body))
+
+        logging.info(f"已加载 {len(har['log']['entries'])} 个录制请求: {self.har_file}")
+
+    def lookup(self, method: str, url: str) -> Optional[Tuple[int, str, Dict[str, str], bytes]]:
+        """按录制顺序返回响应，同一请求多次出现时依次回放，最后一个重复使用"""
+        queue = self.responses.get((method, url))
+        if not queue:
+            self.misses += 1
+            logging.warning(f"回放未命中: {method} {url}")
+            return None
+        if len(queue) > 1:
+            return queue.popleft()
+        return queue[0]
+
+    async def attach(self, context) -> None:
+        """拦截浏览器上下文的所有请求并用录制内容响应"""
+        await context.route('**/*', self._handle_route)
+
+    async def _handle_route(self, route) -> None:
+        request = route.request
+        if request.resource_type in SKIPPED_RESOURCE_TYPES:
+            await route.abort()
+            return
+
+        recorded = self.lookup(request.method, request.url)
+        if recorded is None:
+            await route.abort()
+            return
+
+        status, _, headers, body = recorded
+        await route.fulfill(status=status, headers=headers, body=body)
+
+
+class RecordingTransport:
+    """包装 requests，在返回响应的同时录制下来"""
+    def __init__(self, recorder: NetworkRecorder, inner=requests):
+        self.recorder = recorder
+        self.inner = inner
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        started = time.time()
+        response = self.inner.get(url, **kwargs)
+        if kwargs.get('stream'):
+            self._record_on_close(url, response, started)
+            return response
+        self.recorder.add_entry('GET', url, response.status_code, response.reason,
+                                dict(response.headers), response.content, time.time() - started,
+                                **self._request_details(response, kwargs))
+        return response
+
+    @staticmethod
+    def _request_details(response: requests.Response, kwargs: Dict) -> Dict:
+        """HAR 中需要的请求头和 HTTP 版本"""
+        request = getattr(response, 'request', None)
+        version = getattr(getattr(response, 'raw', None), 'version', None)
+        return {
+            'request_headers': dict(request.headers) if request is not None else kwargs.get('headers'),
+            'http_version': _HTTP_VERSIONS.get(version, 'HTTP/1.1')
+        }
+
+    def _record_on_close(self, url: str, response: requests.Response, started: float) -> None:
+        """流式读取时只录制调用方实际读取的部分，在 close 时写入，不额外下载剩余内容"""
+        consumed: List[bytes] = []
+        recorded = False
+        iter_content = response.iter_content
+        close = response.close
+        details = self._request_details(response, {})
+
+        def recording_iter_content(chunk_size=1, decode_unicode=False):
+            for chunk in iter_content(chunk_size, decode_unicode):
+                consumed.append(chunk.encode(response.encoding or 'utf-8') if isinstance(chunk, str) else chunk)
+                yield chunk
+
+        def recording_close():
+            nonlocal recorded
+            if not recorded:
+                recorded = True
+                self.recorder.add_entry('GET', url, response.status_code, response.reason,
+                                        dict(response.headers), b''.join(consumed), time.time() - started,
+                                        **details)
+            close()
+
+        # 实例属性覆盖方法，response.content 和 with 语句也会经过这里
+        response.iter_content = recording_iter_content
+        response.close = recording_close
+
+
+class ReplayTransport:
+    """与 requests.get 接口兼容的回放传输层"""
+    def __init__(self, replayer: NetworkReplayer):
+        self.replayer = replayer
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        recorded = self.replayer.lookup('GET', url)
+        if recorded is None:
+            raise requests.ConnectionError(f"回放未命中: {url}")
+
+        status, reason, headers, body = recorded
+        response = requests.Response()
+        response.status_code = status
+        response.reason = reason
+        response.url = url
+        response.headers = CaseInsensitiveDict(headers)
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response._content = body
+        # 标记内容已读取，iter_content/close 不会再去访问底层连接
+        response._content_consumed = True
+        return response
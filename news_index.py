@@ -0,0 +1,316 @@
+import argparse
+import csv
+import logging
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import zlib
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime, timedelta
+from itertools import accumulate, islice
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import jieba
+from tabulate import tabulate
+
+from records import NewsItem, format_ts
+
+_ENGLISH_WORD = re.compile(r'^[a-z0-9][a-z0-9\-\'.]*$')
+_CJK = re.compile(r'[぀-ヿ㐀-䶿一-鿿가-힯]')
+# 位置用 16 位无符号整数保存，超长文本后面的词不参与短语匹配
+MAX_POSITION = 65535
+# build 时每个事务索引的条目数，限制一次攒在内存中的倒排记录
+BUILD_BATCH = 10000
+
+
+def normalize(text: str) -> str:
+    """全角转半角、统一小写"""
+    return unicodedata.normalize('NFKC', text).lower()
+
+
+def tokenize(text: str) -> List[str]:
+    """中文用 jieba 分词，英文按单词切分并归一化，标点和空白丢弃"""
+    tokens = []
+    for token in jieba.cut(normalize(text)):
+        token = token.strip()
+        if not token:
+            continue
+        if _ENGLISH_WORD.match(token):
+            tokens.append(token.strip("'.-"))
+        elif _CJK.search(token):
+            tokens.append(token)
+    return [token for token in tokens if token]
+
+
+def _encode_postings(doc_ids: List[int], positions: List[List[int]]) -> Tuple[bytes, bytes]:
+    """文档号按差值编码，位置按 [每篇文档的位置数..., 所有位置...] 排列，再各自 zlib 压缩"""
+    deltas = array('I', [doc_ids[0]] + [b - a for a, b in zip(doc_ids, doc_ids[1:])])
+    counts = array('H', [len(p) for p in positions])
+    flat = array('H', [pos for p in positions for pos in p])
+    return zlib.compress(deltas.tobytes()), zlib.compress(counts.tobytes() + flat.tobytes())
+
+
+def _decode_doc_ids(blob: bytes) -> List[int]:
+    return list(accumulate(array('I', zlib.decompress(blob))))
+
+
+def _decode_positions(blob: bytes, doc_count: int) -> Tuple[array, List[int], array]:
+    """返回 (每篇位置数, 每篇起始偏移, 所有位置)"""
+    values = array('H', zlib.decompress(blob))
+    counts = values[:doc_count]
+    offsets = [0] + list(accumulate(counts))[:-1]
+    return counts, offsets, values[doc_count:]
+
+
+class NewsIndex:
+    """收集到的新闻的全文倒排索引，保存在 SQLite 中
+
+    每次写入结果时追加一批倒排记录（每个词一行），查询时把同一个词的多行合并；
+    `compact` 可以把同一个词的多行合并成一行，加快查询。
+    """
+    def __init__(self, path: str = 'news_index.db'):
+        self.path = path
+        # 流水线模式下结果在线程中写入，连接需要跨线程使用
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS docs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT NOT NULL UNIQUE,
+                title TEXT,
+                snippet TEXT,
+                site TEXT,
+                found_ts INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS idx_docs_site ON docs (site, id);
+            CREATE INDEX IF NOT EXISTS idx_docs_found ON docs (found_ts);
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                doc_count INTEGER NOT NULL,
+                docs BLOB NOT NULL,
+                positions BLOB NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_postings_term ON postings (term);
+        ''')
+
+    def add(self, items: Iterable[NewsItem]) -> int:
+        """索引一批新条目，已索引过的URL会被跳过，返回新增文档数"""
+        postings: Dict[str, Dict[int, List[int]]] = defaultdict(dict)
+        added = 0
+        with self.lock, self.conn:
+            for item in items:
+                cursor = self.conn.execute(
+                    'INSERT OR IGNORE INTO docs (url, title, snippet, site, found_ts) VALUES (?, ?, ?, ?, ?)',
+                    (item.url, item.title, item.snippet, item.site, item.found_ts))
+                if cursor.rowcount == 0:
+                    continue
+                added += 1
+                doc_id = cursor.lastrowid
+                # 标题和摘要之间空一个位置，短语不会跨字段匹配
+                title_tokens = tokenize(item.title or '')
+                tokens = title_tokens + [''] + tokenize(item.snippet or '')
+                for position, token in enumerate(tokens[:MAX_POSITION]):
+                    if token:
+                        postings[token].setdefault(doc_id, []).append(position)
+
+            rows = []
+            for term, docs in postings.items():
+                doc_ids = sorted(docs)
+                docs_blob, positions_blob = _encode_postings(doc_ids, [docs[d] for d in doc_ids])
+                rows.append((term, len(doc_ids), docs_blob, positions_blob))
+            self.conn.executemany(
+                'INSERT INTO postings (term, doc_count, docs, positions) VALUES (?, ?, ?, ?)', rows)
+        return added
+
+    def compact(self) -> None:
+        """把每个词的多批倒排记录合并成一行"""
+        with self.lock, self.conn:
+            terms = [row[0] for row in self.conn.execute(
+                'SELECT term FROM postings GROUP BY term HAVING COUNT(*) > 1')]
+            for term in terms:
+                doc_ids, positions = [], []
+                for docs_blob, positions_blob, doc_count in self.conn.execute(
+                        'SELECT docs, positions, doc_count FROM postings WHERE term = ? ORDER BY rowid', (term,)):
+                    ids = _decode_doc_ids(docs_blob)
+                    counts, offsets, flat = _decode_positions(positions_blob, doc_count)
+                    doc_ids.extend(ids)
+                    positions.extend(flat[o:o + c].tolist() for o, c in zip(offsets, counts))
+                docs_blob, positions_blob = _encode_postings(doc_ids, positions)
+                self.conn.execute('DELETE FROM postings WHERE term = ?', (term,))
+                self.conn.execute('INSERT INTO postings (term, doc_count, docs, positions) VALUES (?, ?, ?, ?)',
+                                  (term, len(doc_ids), docs_blob, positions_blob))
+        logging.info(f"合并了 {len(terms)} 个词的倒排记录")
+
+    def _postings(self, term: str) -> List[Tuple[int, bytes, bytes]]:
+        return self.conn.execute(
+            'SELECT doc_count, docs, positions FROM postings WHERE term = ? ORDER BY rowid', (term,)).fetchall()
+
+    def _id_range(self, since: Optional[int], until: Optional[int]) -> Tuple[int, int]:
+        """文档号随写入时间递增，先把时间范围换算成文档号范围"""
+        if since is None and until is None:
+            return 0, 2 ** 63
+        row = self.conn.execute('SELECT MIN(id), MAX(id) FROM docs WHERE found_ts BETWEEN ? AND ?',
+                                (since or 0, until or 2 ** 62)).fetchone()
+        if row[0] is None:
+            return 1, 0
+        return row[0], row[1]
+
+    def search(self, query: str, phrase: bool = False, site: Optional[str] = None,
+               since: Optional[int] = None, until: Optional[int] = None, limit: int = 20) -> List[Dict]:
+        """查询包含所有词（或整个短语）的文档，按收录时间倒序返回"""
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        with self.lock:
+            rows_by_term = {term: self._postings(term) for term in set(terms)}
+            if any(not rows for rows in rows_by_term.values()):
+                return []
+
+            # 从文档最少的词开始求交集
+            low, high = self._id_range(since, until)
+            ordered = sorted(rows_by_term, key=lambda t: sum(r[0] for r in rows_by_term[t]))
+            candidates = None
+            for term in ordered:
+                ids = set()
+                for _, docs_blob, _ in rows_by_term[term]:
+                    ids.update(_decode_doc_ids(docs_blob))
+                candidates = ids if candidates is None else candidates & ids
+                if not candidates:
+                    return []
+            candidates = {doc_id for doc_id in candidates if low <= doc_id <= high}
+
+            if phrase and len(terms) > 1:
+                candidates = self._match_phrase(terms, rows_by_term, candidates)
+
+            return self._load_docs(sorted(candidates, reverse=True), site, since, until, limit)
+
+    def _match_phrase(self, terms: List[str], rows_by_term, candidates: set) -> set:
+        """检查候选文档中各词的位置是否连续"""
+        positions_by_term: Dict[str, Dict[int, set]] = {}
+        sorted_candidates = sorted(candidates)
+        for term in set(terms):
+            doc_positions: Dict[int, set] = {}
+            for doc_count, docs_blob, positions_blob in rows_by_term[term]:
+                ids = _decode_doc_ids(docs_blob)
+                # 只看落在这一行文档号范围内的候选
+                lo, hi = bisect_left(sorted_candidates, ids[0]), bisect_left(sorted_candidates, ids[-1] + 1)
+                if lo == hi:
+                    continue
+                counts, offsets, flat = _decode_positions(positions_blob, doc_count)
+                for doc_id in sorted_candidates[lo:hi]:
+                    i = bisect_left(ids, doc_id)
+                    if i < len(ids) and ids[i] == doc_id:
+                        doc_positions[doc_id] = set(flat[offsets[i]:offsets[i] + counts[i]])
+            positions_by_term[term] = doc_positions
+
+        matched = set()
+        for doc_id in candidates:
+            starts = positions_by_term[terms[0]].get(doc_id, set())
+            for offset, term in enumerate(terms[1:], start=1):
+                positions = positions_by_term[term].get(doc_id, set())
+                starts = {p for p in starts if p + offset in positions}
+                if not starts:
+                    break
+            if starts:
+                matched.add(doc_id)
+        return matched
+
+    def _load_docs(self, doc_ids: List[int], site: Optional[str], since: Optional[int],
+                   until: Optional[int], limit: int) -> List[Dict]:
+        results = []
+        for start in range(0, len(doc_ids), 500):
+            batch = doc_ids[start:start + 500]
+            sql = (f'SELECT id, title, url, site, found_ts FROM docs WHERE id IN ({",".join("?" * len(batch))})'
+                   ' AND found_ts BETWEEN ? AND ?')
+            params = batch + [since or 0, until or 2 ** 62]
+            if site:
+                sql += ' AND site = ?'
+                params.append(site)
+            sql += ' ORDER BY id DESC'
+            for doc_id, title, url, doc_site, found_ts in self.conn.execute(sql, params):
+                results.append({'title': title, 'url': url, 'site': doc_site, 'found_date': format_ts(found_ts)})
+                if len(results) >= limit:
+                    return results
+        return results
+
+
+def _parse_date(value: Optional[str], end_of_day: bool = False) -> Optional[int]:
+    """解析时间；end_of_day 为 True 时只有日期的写法取当天最后一秒，--until 2024-11-30 包含当天"""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if end_of_day and len(value.strip()) == 10:
+        parsed += timedelta(days=1, seconds=-1)
+    return int(parsed.timestamp())
+
+
+def _items_from_csv(path: Path) -> Iterable[NewsItem]:
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        for row in csv.DictReader(f):
+            try:
+                found_ts = _parse_date(row.get('found_date')) or 0
+            except ValueError:
+                logging.warning(f"{path}: 跳过日期无法解析的行 {row.get('found_date')!r} {row.get('url', '')}")
+                continue
+            yield NewsItem(row.get('title', ''), row.get('url', ''), row.get('snippet', ''),
+                           row.get('site', ''), row.get('time_range', ''), row.get('engine', ''), found_ts)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='游戏新闻全文索引')
+    parser.add_argument('--index', default='news_index.db', help='索引数据库路径')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build = subparsers.add_parser('build', help='把已有的结果文件加入索引')
+    build.add_argument('files', nargs='*', help='结果CSV文件，默认所有 game_news_*.csv')
+
+    subparsers.add_parser('compact', help='合并倒排记录，加快查询')
+
+    query = subparsers.add_parser('query', help='查询')
+    query.add_argument('text', help='查询词，多个词之间为"且"的关系')
+    query.add_argument('--phrase', action='store_true', help='按短语（词序连续）匹配')
+    query.add_argument('--site', help='只查某个网站')
+    query.add_argument('--since', help='起始时间，如 2024-11-01')
+    query.add_argument('--until', help='结束时间（含），如 2024-11-30 或 2024-11-30T12:00:00')
+    query.add_argument('--limit', type=int, default=20)
+    return parser.parse_args()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    args = parse_args()
+    index = NewsIndex(args.index)
+
+    if args.command == 'build':
+        files = [Path(f) for f in args.files] or sorted(Path('.').glob('game_news_*.csv'))
+        for path in files:
+            items = _items_from_csv(path)
+            added = 0
+            while True:
+                batch = list(islice(items, BUILD_BATCH))
+                if not batch:
+                    break
+                added += index.add(batch)
+            logging.info(f"{path}: 新增索引 {added} 条")
+    elif args.command == 'compact':
+        index.compact()
+    elif args.command == 'query':
+        # 词典加载不计入查询耗时
+        jieba.initialize()
+        started = time.perf_counter()
+        results = index.search(args.text, phrase=args.phrase, site=args.site,
+                               since=_parse_date(args.since), until=_parse_date(args.until, end_of_day=True), limit=args.limit)
+        elapsed = (time.perf_counter() - started) * 1000
+        if results:
+            print(tabulate(results, headers='keys', tablefmt='github'))
+        print(f"\n共 {len(results)} 条，用时 {elapsed:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+import asyncio
+import hashlib
+import logging
+import multiprocessing as mp
+import os
+import queue
+import signal
+import time
+from typing import Dict, List, Optional
+
+from game_monitor import GameMonitor
+from pipeline import DEFAULT_RATE_LIMITS
+from records import NewsItem
+
+
+def url_fingerprint(url: str) -> str:
+    """URL指纹，协调进程用它做全局去重"""
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()[:16]
+
+
+class SharedRateLimiter:
+    """跨进程共享的限速器，同一引擎的请求无论来自哪个进程都按最小间隔排队"""
+    def __init__(self, intervals: Dict[str, float], ctx):
+        self.intervals = intervals
+        self._next_slot = {name: ctx.Value('d', 0.0, lock=False) for name in intervals}
+        self._lock = ctx.Lock()
+
+    async def wait(self, engine_name: str) -> None:
+        interval = self.intervals.get(engine_name)
+        if not interval:
+            return
+
+        # 在锁内预定下一个时间槽，锁外等待，避免阻塞其他进程
+        with self._lock:
+            now = time.time()
+            slot = self._next_slot[engine_name]
+            start = max(now, slot.value)
+            slot.value = start + interval
+
+        delay = start - now
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def _worker_main(worker_id: int, sites: List[str], results_queue, stop_event,
+                 rate_limiter: SharedRateLimiter) -> None:
+    """工作进程入口，中断信号交给协调进程处理"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_run_worker(worker_id, sites, results_queue, stop_event, rate_limiter))
+
+
+async def _run_worker(worker_id: int, sites: List[str], results_queue, stop_event,
+                      rate_limiter: SharedRateLimiter) -> None:
+    monitor = GameMonitor(sites=sites, handle_signals=False)
+    monitor.rate_limiter = rate_limiter
+    try:
+        await monitor._init_browser()
+        for site in sites:
+            if stop_event.is_set():
+                break
+            logging.info(f"[worker {worker_id}] Monitoring site: {site}")
+            for time_range in ('24h', '1w'):
+                results = await monitor.search_new_pages(site, time_range)
+                if results:
+                    results_queue.put(('results', worker_id, site,
+                                       [(url_fingerprint(r.url), r.astuple()) for r in results]))
+            results_queue.put(('site_done', worker_id, site))
+    except Exception as e:
+        results_queue.put(('error', worker_id, str(e)))
+    finally:
+        if monitor.browser:
+            await monitor.browser.close()
+        results_queue.put(('done', worker_id))
+
+
+class ParallelCrawler:
+    """多进程爬取：每个工作进程独占一个浏览器和一部分站点，去重、写入和进度由协调进程统一负责"""
+    def __init__(self, workers: Optional[int] = None, rate_limits: Optional[Dict[str, float]] = None):
+        self.workers = workers or os.cpu_count() or 1
+        self.rate_limits = rate_limits or DEFAULT_RATE_LIMITS
+        self.monitor = GameMonitor(handle_signals=False)
+        self.seen_fingerprints = set()
+        self.processes: List[mp.Process] = []
+
+    def _signal_handler(self, signum, frame):
+        # 第二次中断时先结束工作进程，再交给 GameMonitor 强制退出
+        if self.monitor.is_interrupted:
+            for process in self.processes:
+                process.terminate()
+        self.monitor._signal_handler(signum, frame)
+
+    def _handle_message(self, message) -> Optional[int]:
+        """处理工作进程的消息，返回已结束的工作进程编号"""
+        kind, worker_id = message[0], message[1]
+        if kind == 'results':
+            site, items = message[2], message[3]
+            new_results = []
+            for fingerprint, values in items:
+                result = NewsItem(*values)
+                if fingerprint in self.seen_fingerprints or result.url in self.monitor.processed_urls:
+                    continue
+                self.seen_fingerprints.add(fingerprint)
+                self.monitor.processed_urls.add(result.url)
+                new_results.append(result)
+            if new_results:
+                self.monitor._save_results(new_results)
+            logging.info(f"[worker {worker_id}] {site} 去重后新增 {len(new_results)} 条")
+        elif kind == 'site_done':
+            self.monitor.completed_sites.add(message[2])
+            self.monitor._save_progress()
+        elif kind == 'error':
+            logging.error(f"[worker {worker_id}] 爬取失败: {message[2]}")
+        elif kind == 'done':
+            return worker_id
+        return None
+
+    async def crawl(self) -> None:
+        """启动工作进程并在协调进程中汇总结果"""
+        monitor = self.monitor
+        monitor._load_progress()
+        pending = [site for site in monitor.sites if site not in monitor.completed_sites]
+        worker_count = min(self.workers, len(pending))
+        if worker_count == 0:
+            logging.info("没有待处理的站点")
+            return
+
+        signal.signal(signal.SIGINT, self._signal_handler)
+        signal.signal(signal.SIGTERM, self._signal_handler)
+
+        ctx = mp.get_context('spawn')
+        results_queue = ctx.Queue()
+        stop_event = ctx.Event()
+        rate_limiter = SharedRateLimiter(self.rate_limits, ctx)
+
+        # 轮流分配站点，让各进程的负载大致均衡
+        shares = [pending[i::worker_count] for i in range(worker_count)]
+        self.processes = [
+            ctx.Process(target=_worker_main, args=(i, share, results_queue, stop_event, rate_limiter),
+                        daemon=True)
+            for i, share in enumerate(shares)
+        ]
+        logging.info(f"启动 {worker_count} 个爬虫进程处理 {len(pending)} 个站点")
+
+        running = set(range(worker_count))
+        try:
+            for process in self.processes:
+                process.start()
+
+            while running:
+                if monitor.is_interrupted:
+                    stop_event.set()
+                try:
+                    message = results_queue.get_nowait()
+                except queue.Empty:
+                    # 进程异常退出时不会发送 done 消息
+                    for worker_id in list(running):
+                        if not self.processes[worker_id].is_alive() and results_queue.empty():
+                            logging.error(f"[worker {worker_id}] 进程意外退出")
+                            running.discard(worker_id)
+                    await asyncio.sleep(0.2)
+                    continue
+                finished = self._handle_message(message)
+                if finished is not None:
+                    running.discard(finished)
+
+            for process in self.processes:
+                process.join(timeout=30)
+        finally:
+            monitor._save_progress()
+            monitor._save_url_history()
+            if monitor.is_interrupted:
+                logging.info("Task interrupted. Progress saved. Run the script again to continue.")
+            else:
+                logging.info("All sites processed successfully!")
@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, List, Optional
+
+from records import NewsItem
+
+TIME_RANGES = ('24h', '1w')
+
+# 各搜索引擎的最小请求间隔（秒），单进程流水线和多进程模式共用
+DEFAULT_RATE_LIMITS = {
+    'DirectSiteSearch': 5.0,
+    'GoogleSearch': 30.0,
+    'BingSearch': 15.0
+}
+
+
+class RateLimiter:
+    """单进程内的按引擎限速器，接口与多进程的 SharedRateLimiter 相同"""
+    def __init__(self, intervals: Optional[Dict[str, float]] = None):
+        self.intervals = intervals or DEFAULT_RATE_LIMITS
+        self._next_slot: Dict[str, float] = {}
+
+    async def wait(self, engine_name: str) -> None:
+        interval = self.intervals.get(engine_name)
+        if not interval:
+            return
+
+        # 先预定时间槽再等待，同一引擎的多个 worker 也会依次排开
+        now = time.monotonic()
+        start = max(now, self._next_slot.get(engine_name, 0.0))
+        self._next_slot[engine_name] = start + interval
+        delay = start - now
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class FetchJob:
+    """流水线中流动的单元：一个站点、一个时间窗口、一个搜索引擎的一次查询"""
+    __slots__ = ('site', 'time_range', 'engine', 'html', 'results')
+
+    def __init__(self, site: str, time_range: str, engine):
+        self.site = site
+        self.time_range = time_range
+        self.engine = engine
+        self.html: Optional[str] = None
+        self.results: List[NewsItem] = []
+
+
+class CrawlPipeline:
+    """fetch → extract → dedup → enrich → sink 分阶段流水线
+
+    各阶段之间用有界队列连接，下游变慢时上游会在 put 上等待，内存占用保持有界；
+    网络等待、线程中的解析和磁盘写入可以同时进行。每个搜索引擎有独立的抓取队列，
+    同一引擎的请求仍然按顺序发出，并且按 rate_limits 保持最小间隔（回放模式下不限速）。
+    """
+    def __init__(self, monitor, fetch_workers: int = 1, extract_workers: int = 2,
+                 enrich_workers: int = 2, queue_size: int = 16, sink_batch: int = 50,
+                 enricher: Optional[Callable] = None, rate_limits: Optional[Dict[str, float]] = None):
+        self.monitor = monitor
+        self.fetch_workers = fetch_workers
+        self.extract_workers = extract_workers
+        self.enrich_workers = enrich_workers
+        self.queue_size = queue_size
+        self.sink_batch = sink_batch
+        self.enricher = enricher
+        # 多进程模式下协调进程注入的全局限速器优先
+        self.rate_limiter = monitor.rate_limiter or RateLimiter(rate_limits)
+        self._pending_jobs: Dict[str, int] = {}
+        # 每个站点开始抓取的时间和新增条目数，站点完成时交给调度器统计
+        self._site_started: Dict[str, float] = {}
+        self._site_new_items: Dict[str, int] = {}
+
+    async def run(self, sites: List[str]) -> None:
+        monitor = self.monitor
+        engines = monitor.search_engines
+        fetch_queues = {id(engine): asyncio.Queue(self.queue_size) for engine in engines}
+        extract_queue = asyncio.Queue(self.queue_size)
+        dedup_queue = asyncio.Queue(self.queue_size)
+        enrich_queue = asyncio.Queue(self.queue_size)
+        sink_queue = asyncio.Queue(self.queue_size)
+
+        workers = []
+        for engine in engines:
+            for _ in range(self.fetch_workers):
+                workers.append(asyncio.create_task(
+                    self._fetch_worker(fetch_queues[id(engine)], extract_queue)))
+        for _ in range(self.extract_workers):
+            workers.append(asyncio.create_task(self._extract_worker(extract_queue, dedup_queue)))
+        # 去重只有一个 worker，processed_urls 不需要加锁
+        workers.append(asyncio.create_task(self._dedup_worker(dedup_queue, enrich_queue)))
+        for _ in range(self.enrich_workers):
+            workers.append(asyncio.create_task(self._enrich_worker(enrich_queue, sink_queue)))
+        sink = asyncio.create_task(self._sink_worker(sink_queue))
+
+        try:
+            for site in sites:
+                if monitor.is_interrupted:
+                    break
+                if site in monitor.completed_sites:
+                    continue
+                logging.info(f"Monitoring site: {site}")
+                self._pending_jobs[site] = len(TIME_RANGES) * len(engines)
+                for time_range in TIME_RANGES:
+                    for engine in engines:
+                        await fetch_queues[id(engine)].put(FetchJob(site, time_range, engine))
+
+            # 按阶段顺序等待队列排空
+            for fetch_queue in fetch_queues.values():
+                await fetch_queue.join()
+            for stage_queue in (extract_queue, dedup_queue, enrich_queue, sink_queue):
+                await stage_queue.join()
+        finally:
+            for worker in workers + [sink]:
+                worker.cancel()
+            await asyncio.gather(*workers, sink, return_exceptions=True)
+
+    async def _fetch_worker(self, inbox: asyncio.Queue, outbox: asyncio.Queue) -> None:
+        monitor = self.monitor
+        while True:
+            job = await inbox.get()
+            self._site_started.setdefault(job.site, time.monotonic())
+            try:
+                if (not monitor.is_interrupted and job.engine.supports(job.site)
+                        and job.engine.available(job.site)):
+                    if monitor.throttle:
+                        await self.rate_limiter.wait(job.engine.__class__.__name__)
+                    job.html = await job.engine.guarded_fetch(job.site, job.time_range)
+            except Exception as e:
+                logging.error(f"{job.engine.__class__.__name__} fetch error for {job.site}: {str(e)}")
+            await outbox.put(job)
+            inbox.task_done()
+
+    async def _extract_worker(self, inbox: asyncio.Queue, outbox: asyncio.Queue) -> None:
+        while True:
+            job = await inbox.get()
+            error = None
+            try:
+                if job.html:
+                    job.results = await asyncio.to_thread(job.engine.parse, job.html, job.site)
+            except Exception as e:
+                error = e
+                logging.error(f"{job.engine.__class__.__name__} parse error for {job.site}: {str(e)}")
+            if job.html:
+                job.engine.record_parse(job.site, error)
+            job.html = None
+            await outbox.put(job)
+            inbox.task_done()
+
+    async def _dedup_worker(self, inbox: asyncio.Queue, outbox: asyncio.Queue) -> None:
+        while True:
+            job = await inbox.get()
+            try:
+                if job.results:
+                    job.results = await self.monitor._process_search_results(job.results, job.site,
+                                                                            job.time_range)
+                    logging.info(f"从 {job.site} 使用 {job.engine.__class__.__name__} "
+                                 f"获取到 {len(job.results)} 条新内容")
+            except Exception as e:
+                logging.error(f"Dedup error for {job.site}: {str(e)}")
+                job.results = []
+            await outbox.put(job)
+            inbox.task_done()
+
+    async def _enrich_worker(self, inbox: asyncio.Queue, outbox: asyncio.Queue) -> None:
+        while True:
+            job = await inbox.get()
+            try:
+                if job.results and self.enricher:
+                    await self.enricher(job.results)
+            except Exception as e:
+                logging.error(f"Enrich error for {job.site}: {str(e)}")
+            await outbox.put(job)
+            inbox.task_done()
+
+    async def _sink_worker(self, inbox: asyncio.Queue) -> None:
+        """攒批写入CSV，站点的所有查询都写完后再记录进度"""
+        monitor = self.monitor
+        buffer: List[NewsItem] = []
+        finished_sites: List[str] = []
+        while True:
+            job = await inbox.get()
+            try:
+                buffer.extend(job.results)
+                self._site_new_items[job.site] = self._site_new_items.get(job.site, 0) + len(job.results)
+                self._pending_jobs[job.site] -= 1
+                if self._pending_jobs[job.site] == 0:
+                    finished_sites.append(job.site)
+
+                if len(buffer) >= self.sink_batch or finished_sites or inbox.empty():
+                    if buffer:
+                        await asyncio.to_thread(monitor._save_results, buffer)
+                        buffer = []
+                    for site in finished_sites:
+                        if not monitor.is_interrupted:
+                            monitor.completed_sites.add(site)
+                            if monitor.scheduler:
+                                monitor.scheduler.record(site, self._site_new_items.get(site, 0),
+                                                         time.monotonic() - self._site_started[site])
+                    if finished_sites:
+                        monitor._save_progress()
+                        finished_sites = []
+            except Exception as e:
+                logging.error(f"Failed to save results: {str(e)}")
+            finally:
+                inbox.task_done()
@@ -0,0 +1,118 @@
+import asyncio
+import cProfile
+import io
+import logging
+import pstats
+import re
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+class RunProfiler:
+    """按阶段记录 cProfile、tracemalloc 快照和事件循环慢回调，未指定输出目录时不做任何事"""
+    def __init__(self, output_dir: Optional[str] = None, slow_callback: float = 0.1, top_n: int = 30):
+        self.output_dir = Path(output_dir) if output_dir else None
+        self.enabled = self.output_dir is not None
+        self.slow_callback = slow_callback
+        self.top_n = top_n
+        self.timings: List[Dict] = []
+        self._stack: List[cProfile.Profile] = []
+        self._names: Dict[str, int] = {}
+        self._asyncio_handler: Optional[logging.Handler] = None
+
+        if self.enabled:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            tracemalloc.start(25)
+            logging.info(f"性能分析已开启，结果保存到 {self.output_dir}")
+
+    def stage(self, name: str):
+        """包裹一个阶段，嵌套阶段运行时暂停外层阶段的 cProfile"""
+        if not self.enabled:
+            return nullcontext()
+        return self._profile_stage(name)
+
+    @contextmanager
+    def _profile_stage(self, name: str):
+        file_stem = self._unique_name(name)
+        profile = cProfile.Profile()
+        if self._stack:
+            self._stack[-1].disable()
+        else:
+            tracemalloc.reset_peak()
+        self._stack.append(profile)
+
+        snapshot_before = tracemalloc.take_snapshot()
+        started = time.perf_counter()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            elapsed = time.perf_counter() - started
+            snapshot_after = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            self._stack.pop()
+            if self._stack:
+                self._stack[-1].enable()
+
+            self._write_profile(file_stem, profile)
+            self._write_memory(file_stem, snapshot_before, snapshot_after, current, peak)
+            self.timings.append({'stage': name, 'seconds': elapsed, 'peak_mb': peak / 1024 / 1024})
+            logging.info(f"阶段 {name} 耗时 {elapsed:.2f} 秒，内存峰值 {peak / 1024 / 1024:.1f} MB")
+
+    def _unique_name(self, name: str) -> str:
+        stem = re.sub(r'[^\w.-]', '_', name)
+        count = self._names.get(stem, 0)
+        self._names[stem] = count + 1
+        return stem if count == 0 else f'{stem}.{count}'
+
+    def _write_profile(self, stem: str, profile: cProfile.Profile) -> None:
+        profile.dump_stats(str(self.output_dir / f'{stem}.prof'))
+        buffer = io.StringIO()
+        stats = pstats.Stats(profile, stream=buffer)
+        stats.sort_stats('cumulative').print_stats(self.top_n)
+        (self.output_dir / f'{stem}.stats.txt').write_text(buffer.getvalue(), encoding='utf-8')
+
+    def _write_memory(self, stem: str, before, after, current: int, peak: int) -> None:
+        lines = [
+            f'当前分配: {current / 1024 / 1024:.2f} MB',
+            f'峰值分配: {peak / 1024 / 1024:.2f} MB',
+            '',
+            f'阶段内增长最多的 {self.top_n} 处分配:'
+        ]
+        for stat in after.compare_to(before, 'lineno')[:self.top_n]:
+            lines.append(str(stat))
+        (self.output_dir / f'{stem}.memory.txt').write_text('\n'.join(lines), encoding='utf-8')
+
+    def watch_event_loop(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        """开启 asyncio 调试模式，把阻塞事件循环的慢回调记录到单独的日志"""
+        if not self.enabled or self._asyncio_handler:
+            return
+        loop = loop or asyncio.get_running_loop()
+        loop.set_debug(True)
+        loop.slow_callback_duration = self.slow_callback
+
+        handler = logging.FileHandler(self.output_dir / 'slow_callbacks.log', encoding='utf-8')
+        handler.setLevel(logging.WARNING)
+        handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+        logging.getLogger('asyncio').addHandler(handler)
+        self._asyncio_handler = handler
+
+    def close(self) -> None:
+        """写出阶段汇总并停止追踪"""
+        if not self.enabled:
+            return
+        lines = ['| 阶段 | 耗时(秒) | 内存峰值(MB) |', '|------|----------|--------------|']
+        for timing in self.timings:
+            lines.append(f"| {timing['stage']} | {timing['seconds']:.2f} | {timing['peak_mb']:.1f} |")
+        (self.output_dir / 'summary.md').write_text('\n'.join(lines) + '\n', encoding='utf-8')
+
+        if self._asyncio_handler:
+            logging.getLogger('asyncio').removeHandler(self._asyncio_handler)
+            self._asyncio_handler.close()
+            self._asyncio_handler = None
+        tracemalloc.stop()
+        self.enabled = False
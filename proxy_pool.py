@@ -0,0 +1,335 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import requests
+
+from engine_health import BlockedError, detect_block
+
+# 表示不走代理直接连接的池成员
+DIRECT = 'direct'
+# 新出口的先验延迟（秒），拿到第一个样本后被替换
+INITIAL_LATENCY = 1.0
+# 计算评分时延迟的下限，避免本地网络抖动让个别出口的权重失控
+MIN_LATENCY = 0.05
+
+
+class Proxy:
+    """池中的一个出口，保存滚动的延迟、成功率和拦截率（指数加权平均）"""
+    __slots__ = ('url', 'latency', 'success', 'block', 'samples', 'evictions',
+                 'evicted_until', 'probing', 'picks')
+
+    def __init__(self, url: str):
+        self.url = url
+        self.latency = INITIAL_LATENCY
+        self.success = 1.0
+        self.block = 0.0
+        self.samples = 0
+        self.evictions = 0
+        self.evicted_until = 0.0
+        self.probing = False
+        self.picks = 0
+
+    def __repr__(self) -> str:
+        return f'Proxy({self.label!r})'
+
+    @property
+    def label(self) -> str:
+        """日志中显示的名称，隐藏用户名和密码"""
+        if self.url == DIRECT:
+            return DIRECT
+        parts = urlsplit(self.url)
+        return f'{parts.scheme}://{parts.hostname}:{parts.port}'
+
+    def score(self) -> float:
+        """预期每秒能完成的有效请求数，延迟减半则被选中的概率加倍"""
+        return self.success * (1 - self.block) / max(self.latency, MIN_LATENCY)
+
+    def requests_proxies(self) -> Dict[str, Optional[str]]:
+        """requests 的 proxies 参数；直连时显式置空，不使用环境变量里的代理"""
+        if self.url == DIRECT:
+            return {'http': None, 'https': None}
+        return {'http': self.url, 'https': self.url}
+
+    def playwright_proxy(self) -> Optional[Dict[str, str]]:
+        """Playwright new_context 的 proxy 参数"""
+        if self.url == DIRECT:
+            return None
+        parts = urlsplit(self.url)
+        settings = {'server': f'{parts.scheme}://{parts.hostname}:{parts.port}'}
+        if parts.username:
+            settings['username'] = parts.username
+            settings['password'] = parts.password or ''
+        return settings
+
+
+class ProxyPool:
+    """按健康评分加权选择出口的代理池
+
+    每次请求后用指数加权平均更新出口的延迟、成功率和拦截率，评分越高被选中的概率越大。
+    样本足够后成功率过低、拦截率过高或延迟过大的出口会被剔除一段时间（连续剔除时加倍），
+    到期后先用探测请求确认可用再放回池中。
+    """
+    def __init__(self, proxies: List[str], alpha: float = 0.3, min_samples: int = 3,
+                 min_success: float = 0.5, max_block: float = 0.3, max_latency: float = 15.0,
+                 cooldown: float = 300, max_cooldown: float = 3600,
+                 probe_url: str = 'https://www.google.com/generate_204', probe_timeout: float = 10,
+                 clock: Callable[[], float] = time.monotonic, rng: Optional[random.Random] = None):
+        if not proxies:
+            raise ValueError('代理池至少需要一个出口')
+        self.proxies = [Proxy(url) for url in proxies]
+        self.alpha = alpha
+        self.min_samples = min_samples
+        self.min_success = min_success
+        self.max_block = max_block
+        self.max_latency = max_latency
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.probe_url = probe_url
+        self.probe_timeout = probe_timeout
+        self.clock = clock
+        self.rng = rng or random.Random()
+
+    @classmethod
+    def from_env(cls, var: str = 'PROXY_POOL', **kwargs) -> Optional['ProxyPool']:
+        """从环境变量读取逗号分隔的代理列表，未设置时返回 None"""
+        proxies = [p.strip() for p in os.environ.get(var, '').split(',') if p.strip()]
+        if not proxies:
+            return None
+        pool = cls(proxies, **kwargs)
+        logging.info(f"代理池: {', '.join(p.label for p in pool.proxies)}")
+        return pool
+
+    def _evicted(self, proxy: Proxy) -> bool:
+        return proxy.evicted_until > 0
+
+    def choose(self) -> Proxy:
+        """按评分加权随机选择一个出口；全部被剔除时退回最早到期的那个
+
+        样本不足 min_samples 的出口（新加入或刚探测通过的）优先使用，
+        否则一个出口拿到好成绩后其他出口几乎不会被选中，也就无法评估。
+        """
+        candidates = [p for p in self.proxies if not self._evicted(p)]
+        warming = [p for p in candidates if p.samples < self.min_samples]
+        if not candidates:
+            proxy = min(self.proxies, key=lambda p: p.evicted_until)
+            logging.warning(f"代理池中没有可用出口，临时使用 {proxy.label}")
+        elif warming:
+            proxy = self.rng.choice(warming)
+        else:
+            weights = [max(p.score(), 0.01) for p in candidates]
+            proxy = self.rng.choices(candidates, weights=weights)[0]
+        proxy.picks += 1
+        return proxy
+
+    def _update(self, proxy: Proxy, success: float, block: float, latency: Optional[float]) -> None:
+        a = self.alpha
+        proxy.success += a * (success - proxy.success)
+        proxy.block += a * (block - proxy.block)
+        if latency is not None:
+            # 第一个样本直接替换先验值
+            proxy.latency = latency if proxy.samples == 0 else proxy.latency + a * (latency - proxy.latency)
+        proxy.samples += 1
+        self._check(proxy)
+
+    def record_success(self, proxy: Proxy, latency: float) -> None:
+        self._update(proxy, 1.0, 0.0, latency)
+
+    def record_failure(self, proxy: Proxy, reason: str = '') -> None:
+        # 失败（超时、连接错误）按上限计入延迟，慢出口和坏出口同样会被压低评分
+        self._update(proxy, 0.0, 0.0, self.max_latency)
+        logging.debug(f"代理 {proxy.label} 请求失败: {reason}")
+
+    def record_block(self, proxy: Proxy, reason: str = '') -> None:
+        self._update(proxy, 0.0, 1.0, None)
+        logging.debug(f"代理 {proxy.label} 被拦截: {reason}")
+
+    def _check(self, proxy: Proxy) -> None:
+        if self._evicted(proxy) or proxy.samples < self.min_samples:
+            return
+        if proxy.block > self.max_block:
+            self._evict(proxy, f'拦截率 {proxy.block:.2f}')
+        elif proxy.success < self.min_success:
+            self._evict(proxy, f'成功率 {proxy.success:.2f}')
+        elif proxy.latency > self.max_latency:
+            self._evict(proxy, f'延迟 {proxy.latency:.1f}s')
+
+    def _evict(self, proxy: Proxy, reason: str) -> None:
+        cooldown = min(self.base_cooldown * (2 ** proxy.evictions), self.max_cooldown)
+        proxy.evictions += 1
+        proxy.evicted_until = self.clock() + cooldown
+        logging.warning(f"代理 {proxy.label} 被剔除 {cooldown:.0f} 秒: {reason}")
+
+    def _readmit(self, proxy: Proxy, latency: float) -> None:
+        proxy.evicted_until = 0.0
+        proxy.samples = 0
+        proxy.success = 1.0
+        proxy.block = 0.0
+        proxy.latency = latency
+        logging.info(f"代理 {proxy.label} 探测成功，重新加入 ({latency:.2f}s)")
+
+    def due_for_probe(self) -> List[Proxy]:
+        now = self.clock()
+        return [p for p in self.proxies
+                if self._evicted(p) and not p.probing and p.evicted_until <= now]
+
+    def probe(self, proxy: Proxy) -> Optional[float]:
+        """通过出口请求探测地址，成功返回延迟，否则返回 None；可在线程中执行"""
+        started = time.monotonic()
+        try:
+            response = requests.get(self.probe_url, proxies=proxy.requests_proxies(),
+                                    timeout=self.probe_timeout)
+            if response.status_code >= 400 or detect_block(response.url, response.status_code, None):
+                return None
+        except requests.RequestException:
+            return None
+        return time.monotonic() - started
+
+    async def reprobe(self) -> None:
+        """探测冷却到期的出口，通过的放回池中，失败的以加倍的冷却时间继续剔除"""
+        due = self.due_for_probe()
+        if not due:
+            return
+        for proxy in due:
+            proxy.probing = True
+        try:
+            latencies = await asyncio.gather(*(asyncio.to_thread(self.probe, p) for p in due))
+        finally:
+            for proxy in due:
+                proxy.probing = False
+        for proxy, latency in zip(due, latencies):
+            if latency is None:
+                self._evict(proxy, '探测失败')
+            else:
+                self._readmit(proxy, latency)
+
+    @contextmanager
+    def track(self, proxy: Proxy):
+        """统计一次经过出口的请求：BlockedError 计为拦截，其他异常计为失败
+
+        yield 出的函数用来提前停止计时，调用方在收到响应后、随机等待之前调用，
+        之后抛出的 BlockedError 仍然记到这个出口上。
+        """
+        started = self.clock()
+        lap = []
+
+        def stop() -> None:
+            if not lap:
+                lap.append(self.clock() - started)
+
+        try:
+            yield stop
+        except BlockedError as e:
+            self.record_block(proxy, str(e))
+            raise
+        except Exception as e:
+            self.record_failure(proxy, str(e))
+            raise
+        stop()
+        self.record_success(proxy, lap[0])
+
+    def summary(self) -> str:
+        lines = []
+        for p in sorted(self.proxies, key=lambda p: p.score(), reverse=True):
+            state = '剔除' if self._evicted(p) else '可用'
+            lines.append(f"{p.label}: {state} 评分 {p.score():.3f} 延迟 {p.latency:.2f}s "
+                         f"成功率 {p.success:.2f} 拦截率 {p.block:.2f} 选中 {p.picks} 次 剔除 {p.evictions} 次")
+        return '\n'.join(lines)
+
+
+def _self_check(requests_count: int = 120) -> None:
+    """用本地的假代理验证评分和剔除：快、慢、返回 429 和无法连接的出口各一个"""
+    import socket
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    def serve(handler) -> int:
+        server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server.server_address[1]
+
+    class Origin(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            body = b'<html><body>ok</body></html>'
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    def forward_proxy(delay: float = 0.0, status: Optional[int] = None):
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                time.sleep(delay)
+                if status:
+                    self.send_response(status)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                upstream = requests.get(self.path, proxies={'http': None}, timeout=5)
+                self.send_response(upstream.status_code)
+                self.send_header('Content-Type', upstream.headers.get('Content-Type', 'text/html'))
+                self.send_header('Content-Length', str(len(upstream.content)))
+                self.end_headers()
+                self.wfile.write(upstream.content)
+        return Handler
+
+    # 绑定后立即关闭，得到一个没有人监听的端口
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        dead_port = s.getsockname()[1]
+
+    origin = f'http://127.0.0.1:{serve(Origin)}/'
+    proxies = {
+        'fast': f'http://127.0.0.1:{serve(forward_proxy())}',
+        'slow': f'http://127.0.0.1:{serve(forward_proxy(delay=0.6))}',
+        'blocked': f'http://127.0.0.1:{serve(forward_proxy(status=429))}',
+        'dead': f'http://127.0.0.1:{dead_port}',
+    }
+    pool = ProxyPool(list(proxies.values()), max_latency=1.0, cooldown=3600, probe_url=origin,
+                     probe_timeout=1, rng=random.Random(0))
+
+    started = time.monotonic()
+    for _ in range(requests_count):
+        proxy = pool.choose()
+        try:
+            with pool.track(proxy) as stop:
+                response = requests.get(origin, proxies=proxy.requests_proxies(), timeout=1)
+                stop()
+                reason = detect_block(response.url, response.status_code, None)
+                if reason:
+                    raise BlockedError(reason)
+        except Exception:
+            pass
+    print(f'{requests_count} 个请求耗时 {time.monotonic() - started:.1f}s')
+    print(pool.summary())
+
+    names = {url: name for name, url in proxies.items()}
+    evicted = sorted(names[p.url] for p in pool.proxies if pool._evicted(p))
+    assert evicted == ['blocked', 'dead'], evicted
+    picks = {names[p.url]: p.picks for p in pool.proxies}
+    assert picks['fast'] > picks['slow'], picks
+
+    # 剔除到期后重新探测：被拦截的出口探测时仍返回 429，继续剔除
+    for p in pool.proxies:
+        if pool._evicted(p):
+            p.evicted_until = pool.clock()
+    asyncio.run(pool.reprobe())
+    assert sorted(names[p.url] for p in pool.proxies if pool._evicted(p)) == ['blocked', 'dead']
+    print('自检通过')
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+    _self_check()
@@ -0,0 +1,114 @@
+import sys
+import time
+from functools import lru_cache
+from datetime import datetime
+from typing import Optional, Tuple
+
+# CSV 列顺序，与历史结果文件保持兼容（title,url,snippet,site,time_range,found_date 在前）
+CSV_FIELDS = ('title', 'url', 'snippet', 'site', 'time_range', 'found_date', 'publish_time', 'engine',
+              'canonical_url', 'lead')
+
+
+def intern(value: Optional[str]) -> str:
+    """站点、引擎等取值很少的字符串统一驻留，所有条目共享同一个对象"""
+    return sys.intern(value) if value else ''
+
+
+@lru_cache(maxsize=4096)
+def format_ts(ts: int) -> str:
+    """同一批结果的时间戳相同，缓存格式化结果"""
+    return datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S') if ts else ''
+
+
+class NewsItem:
+    """一条搜索结果，从搜索引擎一直传递到写入，时间用整数秒时间戳保存"""
+    __slots__ = ('title', 'url', 'snippet', 'site', 'window', 'engine', 'found_ts', 'publish_ts',
+                 'canonical_url', 'lead')
+
+    def __init__(self, title: str, url: str, snippet: str = '', site: str = '', window: str = '',
+                 engine: str = '', found_ts: int = 0, publish_ts: int = 0,
+                 canonical_url: str = '', lead: str = ''):
+        self.title = title
+        self.url = url
+        self.snippet = snippet
+        self.site = intern(site)
+        self.window = intern(window)
+        self.engine = intern(engine)
+        self.found_ts = found_ts
+        self.publish_ts = publish_ts
+        # 以下字段由文章补充阶段填写
+        self.canonical_url = canonical_url
+        self.lead = lead
+
+    def astuple(self) -> Tuple:
+        """按构造参数顺序输出的值，跨进程传递时用它代替对象本身，接收方用 NewsItem(*values) 还原"""
+        return (self.title, self.url, self.snippet, self.site, self.window,
+                self.engine, self.found_ts, self.publish_ts, self.canonical_url, self.lead)
+
+    def __repr__(self) -> str:
+        return f'NewsItem({self.site!r}, {self.url!r})'
+
+    def to_row(self) -> Tuple:
+        """按 CSV_FIELDS 的顺序输出一行"""
+        return (self.title, self.url, self.snippet, self.site, self.window,
+                format_ts(self.found_ts), format_ts(self.publish_ts), self.engine,
+                self.canonical_url, self.lead)
+
+
+def _measure(count: int = 1_000_000) -> None:
+    """对比旧的字典结构和 NewsItem 在大量缓冲条目下的内存和序列化开销"""
+    import csv
+    import io
+    import pickle
+    import tracemalloc
+
+    titles = [f'《游戏{i}》最新预告公布' for i in range(1000)]
+    urls = [f'https://www.example.com/news/{i}.html' for i in range(count)]
+    site = 'gamersky.com'
+    found_ts = int(time.time())
+
+    def build_dicts():
+        # 旧流程：每条结果一个字典，update 时为每条生成 found_date 字符串
+        return [{'title': titles[i % 1000], 'url': urls[i], 'snippet': titles[i % 1000],
+                 'site': site, 'found_date': datetime.fromtimestamp(found_ts).strftime('%Y-%m-%d %H:%M:%S')}
+                for i in range(count)]
+
+    def build_items():
+        return [NewsItem(titles[i % 1000], urls[i], titles[i % 1000], site, '24h', 'GoogleSearch', found_ts)
+                for i in range(count)]
+
+    for name, build in (('dict', build_dicts), ('NewsItem', build_items)):
+        tracemalloc.start()
+        data = build()
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        started = time.perf_counter()
+        buffer = io.StringIO()
+        if name == 'dict':
+            writer = csv.DictWriter(buffer, fieldnames=list(data[0].keys()))
+            writer.writerows(data)
+        else:
+            csv.writer(buffer).writerows(item.to_row() for item in data)
+        csv_seconds = time.perf_counter() - started
+
+        # 跨进程传递：字典直接 pickle，NewsItem 先转成元组，接收方再还原，两边的转换都计入耗时
+        sample = data[:100_000]
+        started = time.perf_counter()
+        payload = sample if name == 'dict' else [item.astuple() for item in sample]
+        pickled = pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)
+        dumps_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        loaded = pickle.loads(pickled)
+        if name != 'dict':
+            loaded = [NewsItem(*values) for values in loaded]
+        loads_seconds = time.perf_counter() - started
+
+        print(f'{name:>8}: {current / count:6.1f} B/条 (共 {current / 1024 / 1024:7.1f} MB), '
+              f'CSV {csv_seconds:5.2f}s, pickle(10万条) {len(pickled) / 100_000:5.1f} B/条 '
+              f'dumps {dumps_seconds:4.2f}s loads {loads_seconds:4.2f}s')
+        del data, sample, loaded
+
+
+if __name__ == '__main__':
+    _measure(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
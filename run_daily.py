@@ -2,6 +2,7 @@ import os
 import time
 import logging
 import asyncio
+import argparse
 from datetime import datetime
 import smtplib
 import ssl
@@ -10,7 +11,9 @@ from email.mime.multipart import MIMEMultipart
 from email.mime.application import MIMEApplication
 from email.mime.image import MIMEImage
 from pathlib import Path
+from typing import Optional
 from dotenv import load_dotenv
+from profiling import RunProfiler
 
 # 设置日志
 logging.basicConfig(
@@ -92,14 +95,17 @@ class EmailSender:
         except Exception as e:
             logging.error(f"发送邮件失败: {str(e)}")
 
-async def main():
+async def main(profiler: Optional[RunProfiler] = None, budget_minutes: Optional[float] = None):
     start_time = time.time()
     logger.info("开始执行每日爬取任务")
+    profiler = profiler or RunProfiler()
+    profiler.watch_event_loop()
 
     # 执行爬虫
     try:
         import game_monitor
-        await game_monitor.main()
+        with profiler.stage('crawl'):
+            await game_monitor.main(profiler=profiler, budget_minutes=budget_minutes)
     except Exception as e:
         logger.error(f"爬虫任务失败: {str(e)}")
     logger.info("爬虫任务完成")
@@ -107,18 +113,34 @@ async def main():
     # 分析结果
     try:
         import analyze_results
-        analyze_results.main()
+        with profiler.stage('analysis'):
+            analyze_results.main(profiler=profiler)
     except Exception as e:
         logger.error(f"分析任务失败: {str(e)}")
     logger.info("分析任务完成")
 
     # 发送邮件
-    email_sender = EmailSender()
-    email_sender.send_email()
+    with profiler.stage('email'):
+        email_sender = EmailSender()
+        email_sender.send_email()
 
     end_time = time.time()
     duration = (end_time - start_time) / 60  # 转换为分钟
     logger.info(f"所有任务完成，耗时: {duration:.2f}分钟")
 
+def parse_args():
+    parser = argparse.ArgumentParser(description='每日爬取、分析并发送邮件')
+    parser.add_argument('--profile', action='store_true',
+                        help='开启性能分析，结果写入 profile_<时间戳> 目录')
+    parser.add_argument('--budget', type=float, metavar='MINUTES',
+                        help='爬取阶段的时间预算（分钟），用尽时提前结束并生成部分报告')
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    args = parse_args()
+    profile_dir = f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}" if args.profile else None
+    profiler = RunProfiler(profile_dir)
+    try:
+        asyncio.run(main(profiler, args.budget))
+    finally:
+        profiler.close()
@@ -0,0 +1,89 @@
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+# 历史统计的衰减系数，让最近几次运行的表现占主导
+STATS_DECAY = 0.8
+# 没有历史记录的站点按平均收益估计，再乘这个系数，保证新站点也会被尝试
+NEW_SITE_OPTIMISM = 1.0
+
+
+class TimeBudget:
+    """整次运行的时间预算"""
+    def __init__(self, seconds: float, clock: Callable[[], float] = time.monotonic):
+        self.seconds = seconds
+        self.clock = clock
+        self.started = clock()
+
+    def elapsed(self) -> float:
+        return self.clock() - self.started
+
+    def remaining(self) -> float:
+        return max(0.0, self.seconds - self.elapsed())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+class BudgetScheduler:
+    """按预期收益（每秒新增条目数）排列站点，并根据剩余预算给每个请求分配超时"""
+    def __init__(self, budget_seconds: float, stats_file: str = 'site_stats.json',
+                 requests_per_site: int = 6, min_request_timeout: float = 10, slack: float = 3.0):
+        self.budget = TimeBudget(budget_seconds)
+        self.stats_file = stats_file
+        self.requests_per_site = requests_per_site
+        self.min_request_timeout = min_request_timeout
+        self.slack = slack
+        self.stats: Dict[str, Dict[str, float]] = self._load_stats()
+        self.pending_sites = 0
+
+    def _load_stats(self) -> Dict[str, Dict[str, float]]:
+        try:
+            if Path(self.stats_file).exists():
+                with open(self.stats_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+        except Exception as e:
+            logging.warning(f"加载站点统计失败: {str(e)}")
+        return {}
+
+    def save_stats(self) -> None:
+        try:
+            with open(self.stats_file, 'w', encoding='utf-8') as f:
+                json.dump(self.stats, f, ensure_ascii=False, indent=4)
+        except Exception as e:
+            logging.error(f"保存站点统计失败: {str(e)}")
+
+    def expected_yield(self, site: str) -> float:
+        """预期每秒新增条目数"""
+        stats = self.stats.get(site)
+        if not stats or stats['seconds'] <= 0:
+            known = [s['new_items'] / s['seconds'] for s in self.stats.values() if s['seconds'] > 0]
+            return (sum(known) / len(known) if known else 1.0) * NEW_SITE_OPTIMISM
+        return stats['new_items'] / stats['seconds']
+
+    def order(self, sites: List[str]) -> List[str]:
+        """收益高的站点排在前面，预算不够时优先覆盖"""
+        ordered = sorted(sites, key=self.expected_yield, reverse=True)
+        self.pending_sites = len(ordered)
+        logging.info("站点优先级: " + ', '.join(f"{s}({self.expected_yield(s):.3f}/s)" for s in ordered))
+        return ordered
+
+    def record(self, site: str, new_items: int, seconds: float) -> None:
+        stats = self.stats.setdefault(site, {'new_items': 0.0, 'seconds': 0.0, 'runs': 0})
+        stats['new_items'] = stats['new_items'] * STATS_DECAY + new_items
+        stats['seconds'] = stats['seconds'] * STATS_DECAY + seconds
+        stats['runs'] += 1
+        self.pending_sites = max(0, self.pending_sites - 1)
+
+    def request_timeout(self, default: float) -> float:
+        """按剩余预算平均分给剩余请求（留出余量），但不超过默认值和剩余时间"""
+        remaining = self.budget.remaining()
+        pending_requests = max(1, self.pending_sites * self.requests_per_site)
+        share = remaining / pending_requests * self.slack
+        return min(default, remaining, max(self.min_request_timeout, share))
+
+    def can_start_site(self) -> bool:
+        """剩余时间连一个请求都不够时不再开始新站点"""
+        return self.budget.remaining() >= self.min_request_timeout